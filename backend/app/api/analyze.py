@@ -3,15 +3,40 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
 import pandas as pd
+import asyncio
+import os
+import re
+import json
+import math
 import uuid
 from datetime import datetime
-from ..api.upload import file_storage
+from ..api.upload import file_storage, dataset_versions
+from ..services.index_service import index_manager
+from ..services.memory_governor import memory_governor
+from ..services.query_parser import parse_filters, filters_from_mentions, describe_filters, find_columns, fold_text
+from ..services.sketches import sketch_store
+from ..services.result_cache import result_cache
+from ..services.chart_data import chart_builder, COLORS
+from ..services.aggregates import FrameAggregates
+from ..services.date_detection import iso_records, iso_values
+from ..services.time_rollups import rollup_store, DatasetRollups
+from ..services.lookup_index import lookup_store, QuestionTerms
 
 router = APIRouter()
 
+MAX_BATCH_QUESTIONS = int(os.getenv("ANALYZE_BATCH_MAX_QUESTIONS", "50"))
+
+# Words that ask for a rollup grain; the first is used in answers
+GRAIN_WORDS = {
+    "day": ("daily", "by day", "per day", "each day"),
+    "week": ("weekly", "by week", "per week", "each week"),
+    "month": ("monthly", "by month", "per month", "each month")
+}
+
 class AnalysisRequest(BaseModel):
     file_id: str
     question: str
+    exact: bool = False  # Never answer from sketches or samples
 
 class AnalysisResponse(BaseModel):
     id: str
@@ -19,95 +44,493 @@ class AnalysisResponse(BaseModel):
     answer: str
     data: List[Dict[str, Any]]
     chart: Optional[Dict[str, Any]] = None
+    filters: List[Dict[str, Any]] = []
+    approximate: bool = False
+    error_bounds: Optional[Dict[str, Any]] = None
     created_at: str = Field(default_factory=lambda: datetime.now().isoformat())
 
+class BatchAnalysisRequest(BaseModel):
+    file_id: str
+    questions: List[str]
+    exact: bool = False
+
+def _value_counts(counts: pd.Series, column: str):
+    """Top values of a column plus a bar chart with the long tail folded into "Other" """
+    top = counts.head(10)
+    result_data = [
+        {"column": column, "value": k, "count": v}
+        for k, v in zip(iso_values(top.index), top.tolist())
+    ]
+    shown = counts.head(chart_builder.max_bars)
+    chart_data = chart_builder.bar(
+        iso_values(shown.index), shown.tolist(), column,
+        other_total=int(counts.sum() - shown.sum())
+    )
+    return result_data, chart_data
+
+def _json_safe(value: Any) -> Any:
+    """Replace NaN/inf (e.g. the mean of an empty filtered frame) with None, recursively"""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {k: _json_safe(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_json_safe(v) for v in value]
+    return value
+
+def _route(question_lower: str, mentioned_numeric: List[str]) -> str:
+    """Pick the kind of analysis a folded question asks for"""
+    if "distinct" in question_lower or "unique" in question_lower:
+        return "distinct"
+    if "median" in question_lower or "percentile" in question_lower:
+        return "quantile"
+    if "most common" in question_lower or "most frequent" in question_lower or "top values" in question_lower:
+        return "top_values"
+    if "histogram" in question_lower or "distribution" in question_lower:
+        return "distribution"
+    if "scatter" in question_lower and len(mentioned_numeric) >= 2:
+        return "scatter"
+    if "trend" in question_lower or "over time" in question_lower or re.search(r"\bline\b", question_lower):
+        return "trend"
+    if any(word in question_lower for words in GRAIN_WORDS.values() for word in words):
+        return "trend"
+    if "top" in question_lower and "5" in question_lower:
+        return "top_rows"
+    if "average" in question_lower or "mean" in question_lower:
+        return "average"
+    if "count" in question_lower or "total" in question_lower:
+        return "count"
+    return "rows"
+
+def _requested_quantile(question_lower: str) -> float:
+    match = re.search(r"(\d+(?:\.\d+)?)(?:st|nd|rd|th)?\s*percentile", question_lower)
+    return float(match.group(1)) / 100 if match else 0.5
+
+def _top_values_column(df: pd.DataFrame, mentioned: List[str], numeric_cols: List[str]) -> str:
+    columns = mentioned or [c for c in df.columns if c not in numeric_cols] or df.columns.tolist()
+    return columns[0]
+
+def _distribution_column(df: pd.DataFrame, question_lower: str, mentioned: List[str], numeric_cols: List[str]) -> str:
+    categorical = [c for c in df.columns if c not in numeric_cols]
+    if mentioned:
+        return mentioned[0]
+    if "categor" in question_lower and categorical:
+        return categorical[0]
+    return (numeric_cols or df.columns.tolist())[0]
+
+class _Question:
+    """A question resolved against the (filtered) frame it will be answered from"""
+    
+    def __init__(self, file_id: str, question: str, df: pd.DataFrame, filters: List[Dict[str, Any]],
+                 terms: Optional[QuestionTerms] = None):
+        self.file_id = file_id
+        self.question = question
+        self.filters = filters
+        # The question is folded the same way as the cache key so
+        # equivalent phrasings get the same answer
+        self.question_lower = fold_text(question)
+        # Columns come from the dataset's lookup index when it has one, which
+        # also catches partial ("revenue") and misspelled column names
+        self.mentioned = terms.columns if terms else find_columns(question, df.columns.tolist())
+        self.numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+        self.mentioned_numeric = [c for c in self.mentioned if c in self.numeric_cols] or self.numeric_cols
+        self.route = _route(self.question_lower, self.mentioned_numeric)
+
+def _plan(q: _Question, df: pd.DataFrame, aggregates: FrameAggregates, sketches) -> None:
+    """Register the frame aggregates a question will need, unless sketches answer it"""
+    if q.route == "distinct" and not sketches:
+        aggregates.request(distinct=q.mentioned or df.columns.tolist())
+    elif q.route == "quantile" and not sketches:
+        aggregates.request(quantiles={_requested_quantile(q.question_lower): q.mentioned_numeric})
+    elif q.route == "average" and not sketches:
+        aggregates.request(means=q.mentioned_numeric)
+    elif q.route == "top_values":
+        column = _top_values_column(df, q.mentioned, q.numeric_cols)
+        if not (sketches and column in sketches.frequent):
+            aggregates.request(value_counts=[column])
+    elif q.route == "distribution":
+        column = _distribution_column(df, q.question_lower, q.mentioned, q.numeric_cols)
+        if column not in q.numeric_cols:
+            aggregates.request(value_counts=[column])
+
+def _answer(q: _Question, df: pd.DataFrame, aggregates: FrameAggregates, sketches) -> Dict[str, Any]:
+    """Answer a resolved question from its frame, shared aggregates and sketches"""
+    question_lower, mentioned = q.question_lower, q.mentioned
+    numeric_cols, mentioned_numeric = q.numeric_cols, q.mentioned_numeric
+    approximate = False
+    chart_data = None
+    
+    # Mock analysis logic (replace with actual AI/ML analysis)
+    if q.route == "distinct":
+        # Count distinct values per column
+        columns = mentioned or df.columns.tolist()
+        if sketches:
+            result_data = sketches.distinct_counts(columns)
+            approximate = True
+        else:
+            counts = aggregates.nunique(columns)
+            result_data = [{"column": c, "distinct_count": counts[c]} for c in columns]
+        answer = f"Here are the distinct value counts for {len(columns)} columns."
+    
+    elif q.route == "quantile":
+        # Median or requested percentile of numeric columns
+        quantile = _requested_quantile(question_lower)
+        if sketches:
+            result_data = sketches.quantile_values(mentioned_numeric, quantile)
+            approximate = True
+        else:
+            quantiles = aggregates.quantile(mentioned_numeric, quantile)
+            result_data = [{"column": k, "quantile": quantile, "value": v} for k, v in quantiles.items()]
+        answer = f"Here is the {'median' if quantile == 0.5 else f'{quantile * 100:g}th percentile'} of numeric columns in your dataset."
+    
+    elif q.route == "top_values":
+        # Most frequent values of the mentioned (or first categorical) column
+        column = _top_values_column(df, mentioned, numeric_cols)
+        if sketches and column in sketches.frequent:
+            result_data = sketches.top_values(column, 10)
+            approximate = True
+            shown = sketches.top_values(column, chart_builder.max_bars)
+            chart_data = chart_builder.bar(
+                [item["value"] for item in shown], [item["count"] for item in shown], column,
+                other_total=max(sketches.frequent[column].count - sum(item["count"] for item in shown), 0)
+            )
+        else:
+            result_data, chart_data = _value_counts(aggregates.value_counts(column), column)
+        answer = f"Here are the most common values of {column}."
+    
+    elif q.route == "distribution":
+        # Fixed-bin histogram for numeric columns, capped bar chart for categories
+        column = _distribution_column(df, question_lower, mentioned, numeric_cols)
+        if column in numeric_cols:
+            counts, edges = chart_builder.histogram_counts(df[column])
+            result_data = [
+                {"bin_start": lo, "bin_end": hi, "count": n}
+                for lo, hi, n in zip(edges[:-1].tolist(), edges[1:].tolist(), counts.tolist())
+            ]
+            chart_data = chart_builder.histogram(df[column], column)
+        else:
+            result_data, chart_data = _value_counts(aggregates.value_counts(column), column)
+        answer = f"Here is the distribution of {column}."
+    
+    elif q.route == "scatter":
+        # Relationship between two numeric columns
+        x, y = mentioned_numeric[0], mentioned_numeric[1]
+        chart_data = chart_builder.scatter(df, x, y)
+        result_data = [{x: point["x"], y: point["y"]} for point in chart_data["data"]["datasets"][0]["data"]]
+        answer = f"Here is {y} plotted against {x} ({len(result_data)} of {len(df)} points shown)."
+    
+    elif q.route == "trend":
+        # Line chart of numeric columns over a date column (the first mentioned
+        # one, else the first in the dataset), or over row order without one
+        date_cols = df.select_dtypes(include=['datetime']).columns.tolist()
+        x = next((c for c in mentioned if c in date_cols), date_cols[0] if date_cols else None)
+        columns = [c for c in mentioned_numeric if c != x][:len(COLORS)]
+        if columns and x:
+            # Served from the upload's rollups; filtered frames are rolled up on the fly
+            how = "mean" if "average" in question_lower or "mean" in question_lower else "sum"
+            grain = next((g for g, words in GRAIN_WORDS.items() if any(w in question_lower for w in words)), None)
+            rollups = None if q.filters else rollup_store.get(q.file_id)
+            if rollups is None or x not in rollups.rollups or any(c not in rollups.numeric_columns for c in columns):
+                rollups = DatasetRollups(df, [x], columns)
+            grain, series = rollups.series(x, columns, how, grain, chart_builder.max_points)
+            chart_data = chart_builder.line(series, x, columns, title=f"{how.title()} by {grain}")
+            labels = chart_data["data"]["labels"]
+            result_data = [
+                {x: label, **{ds["label"]: ds["data"][i] for ds in chart_data["data"]["datasets"]}}
+                for i, label in enumerate(labels)
+            ]
+            answer = f"Here is the {GRAIN_WORDS[grain][0]} {how} of {', '.join(columns)} over {x} ({len(labels)} of {len(series)} {grain}s shown)."
+        elif columns:
+            chart_data = chart_builder.line(df, None, columns)
+            labels = chart_data["data"]["labels"]
+            result_data = [
+                {"row": label, **{ds["label"]: ds["data"][i] for ds in chart_data["data"]["datasets"]}}
+                for i, label in enumerate(labels)
+            ]
+            answer = f"Here is the trend of {', '.join(columns)} ({len(labels)} of {len(df)} points shown)."
+        else:
+            result_data = []
+            answer = "No numeric columns found to chart."
+    
+    elif q.route == "top_rows":
+        # Show top 5 rows
+        result_data = iso_records(df.head(5))
+        answer = f"Here are the top 5 rows from your {len(df)} row dataset."
+    
+    elif q.route == "average":
+        # Calculate averages for numeric columns
+        if len(mentioned_numeric) > 0:
+            if sketches:
+                result_data = sketches.means(mentioned_numeric)
+                approximate = True
+            else:
+                averages = aggregates.mean(mentioned_numeric)
+                result_data = [{"column": k, "average": round(v, 2)} for k, v in averages.items()]
+            answer = f"Here are the averages for numeric columns in your dataset."
+            chart_data = chart_builder.bar(
+                [item["column"] for item in result_data],
+                [item["average"] for item in result_data],
+                "Average Values",
+                additive=False
+            )
+        else:
+            result_data = []
+            answer = "No numeric columns found for averaging."
+    
+    elif q.route == "count":
+        # Count rows
+        result_data = [{"total_rows": len(df)}]
+        answer = f"Your dataset contains {len(df)} rows."
+    
+    else:
+        # Default: show first few rows
+        result_data = iso_records(df.head(10))
+        answer = f"Here are the first 10 rows from your dataset with {len(df.columns)} columns."
+    
+    if approximate:
+        answer = f"{answer} These values are approximate; ask for an exact answer if you need one."
+    
+    if q.filters:
+        answer = f"Filtered to {len(df)} rows where {describe_filters(q.filters)}. {answer}"
+    
+    analysis_result = AnalysisResponse(
+        id=str(uuid.uuid4()),
+        question=q.question,
+        answer=answer,
+        data=_json_safe(result_data),
+        chart=_json_safe(chart_data),
+        filters=q.filters,
+        approximate=approximate,
+        error_bounds=sketches.error_bounds() if approximate else None
+    )
+    return analysis_result.dict()
+
+def _cached_result(cache_key, question: str) -> Optional[Dict[str, Any]]:
+    """A cached answer re-stamped for this request, if any"""
+    cached = result_cache.get(cache_key)
+    if cached is None:
+        return None
+    analysis_result = AnalysisResponse(**{
+        **cached,
+        "id": str(uuid.uuid4()),
+        "question": question,
+        "created_at": datetime.now().isoformat()
+    })
+    return analysis_result.dict()
+
+def _parse_filters(file_id: str, dataset: pd.DataFrame, question: str,
+                   terms: Optional[QuestionTerms] = None) -> List[Dict[str, Any]]:
+    """
+    Filters in a question. With a lookup index, values of low-cardinality
+    columns are checked against it and values mentioned on their own
+    ("revenue in EMEA") become equality filters on their column.
+    """
+    lookup = lookup_store.get(file_id) if terms else None
+    
+    def stored_value(column: str, value: Any) -> Any:
+        if lookup and lookup.covers(column):
+            return lookup.stored_value(column, value)
+        return index_manager.stored_value(file_id, dataset, column, value)
+    
+    if terms is None:
+        return parse_filters(question, dataset.columns.tolist(), stored_value)
+    
+    filters = filters_from_mentions(terms.tails, stored_value)
+    filtered = {f["column"] for f in filters}
+    # Several values of one column ("EMEA or APAC", "Pro vs Free") match any of them
+    implied: Dict[str, List[Any]] = {}
+    for column, value in terms.values:
+        if column not in filtered and value not in implied.setdefault(column, []):
+            implied[column].append(value)
+    filters += [
+        {"column": column, "op": "==", "value": values[0]} if len(values) == 1
+        else {"column": column, "op": "in", "value": values}
+        for column, values in implied.items()
+    ]
+    return filters
+
+def _resolve_terms(file_id: str, question: str) -> Optional[QuestionTerms]:
+    lookup = lookup_store.get(file_id)
+    return lookup.resolve(question) if lookup else None
+
+def run_analysis(request: AnalysisRequest) -> Dict[str, Any]:
+    """
+    Answer a natural language question about an uploaded dataset.
+    
+    Shared by the /analyze endpoint and analysis jobs; raises LookupError
+    when the file does not exist.
+    """
+    if request.file_id not in file_storage:
+        raise LookupError("File not found")
+    
+    dataset = file_storage[request.file_id]
+    
+    # Re-asked questions against an unchanged dataset are served from the cache
+    cache_key = result_cache.key(
+        request.file_id, dataset_versions.get(request.file_id, 0), request.question, request.exact
+    )
+    cached = _cached_result(cache_key, request.question)
+    if cached is not None:
+        return cached
+    
+    # Narrow the dataset to any equality/range filters in the question,
+    # resolved through the dataset's hash and sorted indexes
+    terms = _resolve_terms(request.file_id, request.question)
+    filters = _parse_filters(request.file_id, dataset, request.question, terms)
+    df = index_manager.filter_frame(request.file_id, dataset, filters)
+    if filters:
+        # Indexes built for the filters count against the memory budget
+        memory_governor.enforce_budget(keep=request.file_id)
+    
+    # Sketches summarize the whole dataset, so they only answer unfiltered questions
+    sketches = None if request.exact or filters else sketch_store.get(request.file_id)
+    
+    result = _answer(_Question(request.file_id, request.question, df, filters, terms), df, FrameAggregates(df), sketches)
+    result_cache.put(cache_key, result)
+    return result
+
+def run_batch_analysis(request: BatchAnalysisRequest) -> Dict[str, Any]:
+    """
+    Answer many questions about one dataset with shared passes over the data.
+    
+    Questions with the same filters share one filtered frame, and their
+    aggregations are merged so each frame's columns are scanned once. A
+    question that fails is reported alongside the others instead of failing
+    the batch; raises LookupError when the file does not exist.
+    """
+    if request.file_id not in file_storage:
+        raise LookupError("File not found")
+    
+    dataset = file_storage[request.file_id]
+    version = dataset_versions.get(request.file_id, 0)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(request.questions)
+    cache_keys = {}
+    terms: Dict[int, Optional[QuestionTerms]] = {}
+    groups: Dict[str, List[int]] = {}
+    group_filters: Dict[str, List[Dict[str, Any]]] = {}
+    cached = 0
+    
+    # Serve what we can from the cache and group the rest by filter set
+    for i, question in enumerate(request.questions):
+        cache_keys[i] = result_cache.key(request.file_id, version, question, request.exact)
+        results[i] = _cached_result(cache_keys[i], question)
+        if results[i] is not None:
+            cached += 1
+            continue
+        try:
+            terms[i] = _resolve_terms(request.file_id, question)
+            filters = _parse_filters(request.file_id, dataset, question, terms[i])
+        except Exception as e:
+            results[i] = {"question": question, "error": str(e)}
+            continue
+        group = json.dumps(filters, sort_keys=True, default=str)
+        groups.setdefault(group, []).append(i)
+        group_filters[group] = filters
+    
+    passes = 0
+    for group, positions in groups.items():
+        filters = group_filters[group]
+        df = index_manager.filter_frame(request.file_id, dataset, filters)
+        if filters:
+            memory_governor.enforce_budget(keep=request.file_id)
+        sketches = None if request.exact or filters else sketch_store.get(request.file_id)
+        aggregates = FrameAggregates(df)
+        
+        # Plan every question first so the aggregates are computed together
+        resolved = {}
+        for i in positions:
+            try:
+                resolved[i] = _Question(request.file_id, request.questions[i], df, filters, terms[i])
+                _plan(resolved[i], df, aggregates, sketches)
+            except Exception as e:
+                results[i] = {"question": request.questions[i], "error": str(e)}
+        
+        for i, q in resolved.items():
+            try:
+                results[i] = _answer(q, df, aggregates, sketches)
+                result_cache.put(cache_keys[i], results[i])
+            except Exception as e:
+                results[i] = {"question": q.question, "error": str(e)}
+        passes += aggregates.passes
+    
+    return {
+        "results": results,
+        "stats": {
+            "questions": len(request.questions),
+            "cached": cached,
+            "frames": len(groups),
+            "aggregation_passes": passes
+        }
+    }
+
 @router.post("/analyze")
 async def analyze_data(request: AnalysisRequest) -> JSONResponse:
     """
     Analyze data based on a natural language question
     """
+    # Check if file exists
+    if request.file_id not in file_storage:
+        raise HTTPException(status_code=404, detail="File not found")
+    
     try:
-        # Check if file exists
-        if request.file_id not in file_storage:
-            raise HTTPException(status_code=404, detail="File not found")
+        # Filtering, aggregation and reloading a spilled dataset all block,
+        # so they run in a worker thread like batch analysis
+        result = await asyncio.to_thread(run_analysis, request)
         
-        df = file_storage[request.file_id]
-        
-        # Simple analysis based on question keywords
-        question_lower = request.question.lower()
-        
-        # Mock analysis logic (replace with actual AI/ML analysis)
-        if "top" in question_lower and "5" in question_lower:
-            # Show top 5 rows
-            result_data = df.head(5).to_dict('records')
-            answer = f"Here are the top 5 rows from your {len(df)} row dataset."
-            chart_type = "table"
-            
-        elif "average" in question_lower or "mean" in question_lower:
-            # Calculate averages for numeric columns
-            numeric_cols = df.select_dtypes(include=['number']).columns
-            if len(numeric_cols) > 0:
-                averages = df[numeric_cols].mean().to_dict()
-                result_data = [{"column": k, "average": round(v, 2)} for k, v in averages.items()]
-                answer = f"Here are the averages for numeric columns in your dataset."
-                chart_type = "bar"
-            else:
-                result_data = []
-                answer = "No numeric columns found for averaging."
-                chart_type = None
-                
-        elif "count" in question_lower or "total" in question_lower:
-            # Count rows
-            result_data = [{"total_rows": len(df)}]
-            answer = f"Your dataset contains {len(df)} rows."
-            chart_type = None
-            
-        else:
-            # Default: show first few rows
-            result_data = df.head(10).to_dict('records')
-            answer = f"Here are the first 10 rows from your dataset with {len(df.columns)} columns."
-            chart_type = "table"
-        
-        # Create chart data if applicable
-        chart_data = None
-        if chart_type == "bar" and result_data:
-            chart_data = {
-                "type": "bar",
-                "data": {
-                    "labels": [item.get("column", "") for item in result_data],
-                    "datasets": [{
-                        "label": "Average Values",
-                        "data": [item.get("average", 0) for item in result_data],
-                        "backgroundColor": ["#3B82F6", "#10B981", "#F59E0B", "#EF4444", "#8B5CF6"]
-                    }]
-                },
-                "options": {
-                    "responsive": True,
-                    "plugins": {
-                        "legend": {"position": "top"},
-                        "title": {"display": True, "text": "Analysis Results"}
-                    }
-                }
+        return JSONResponse(
+            status_code=200,
+            content={
+                "success": True,
+                "data": result
             }
+        )
         
-        analysis_result = AnalysisResponse(
-            id=str(uuid.uuid4()),
-            question=request.question,
-            answer=answer,
-            data=result_data,
-            chart=chart_data
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Analysis failed: {str(e)}"
         )
+
+@router.post("/analyze/batch")
+async def analyze_batch(request: BatchAnalysisRequest) -> JSONResponse:
+    """
+    Analyze many questions about one file in a single request
+    """
+    if request.file_id not in file_storage:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    if not request.questions or len(request.questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch must contain between 1 and {MAX_BATCH_QUESTIONS} questions"
+        )
+    
+    try:
+        result = await asyncio.to_thread(run_batch_analysis, request)
         
         return JSONResponse(
             status_code=200,
             content={
                 "success": True,
-                "data": analysis_result.dict()
+                "data": result
             }
         )
         
     except Exception as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Analysis failed: {str(e)}"
-        ) 
\ No newline at end of file
+            detail=f"Batch analysis failed: {str(e)}"
+        )
+
+@router.get("/analyze/cache/stats")
+async def get_cache_stats() -> JSONResponse:
+    """
+    Get hit-rate counters for the analysis result cache
+    """
+    return JSONResponse(
+        status_code=200,
+        content={
+            "success": True,
+            "data": result_cache.stats()
+        }
+    )
@@ -0,0 +1,129 @@
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import JSONResponse
+from starlette.datastructures import UploadFile as StarletteUploadFile
+import asyncio
+import shutil
+import tempfile
+from typing import Optional
+from ..api.analyze import AnalysisRequest, run_analysis
+from ..api.upload import ingest_upload
+from ..services.job_queue import job_scheduler, run_in_thread, PRIORITIES
+
+router = APIRouter()
+
+class AnalysisJobRequest(AnalysisRequest):
+    priority: str = "interactive"
+
+def _client_id(request: Request) -> str:
+    """Identify the caller for per-client concurrency caps"""
+    return request.headers.get("X-Client-Id") or (request.client.host if request.client else "anonymous")
+
+def _job_response(job, status_code: int = 200) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={
+            "success": True,
+            "data": job.info().dict()
+        }
+    )
+
+def _get_job(job_id: str):
+    job = job_scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/jobs/upload")
+async def submit_upload_job(
+    request: Request,
+    file: UploadFile = File(...),
+    index_columns: Optional[str] = Form(None),
+    priority: str = Form("bulk")
+) -> JSONResponse:
+    """
+    Submit a file upload to be parsed in the background
+    """
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Unknown priority: {priority}")
+
+    # The request's upload is closed once we respond, so keep a copy on disk
+    spooled = tempfile.TemporaryFile()
+    await asyncio.to_thread(shutil.copyfileobj, file.file, spooled)
+    size = spooled.tell()
+    spooled.seek(0)
+    upload = StarletteUploadFile(file=spooled, size=size, filename=file.filename, headers=file.headers)
+
+    async def work(job):
+        try:
+            file_info = await ingest_upload(upload, index_columns, progress=job.report)
+            return file_info.dict()
+        finally:
+            spooled.close()
+
+    job = job_scheduler.submit("upload", _client_id(request), priority, work)
+    return _job_response(job, status_code=202)
+
+@router.post("/jobs/analyze")
+async def submit_analysis_job(request: Request, body: AnalysisJobRequest) -> JSONResponse:
+    """
+    Submit a question to be analyzed in the background
+    """
+    if body.priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Unknown priority: {body.priority}")
+
+    analysis_request = AnalysisRequest(file_id=body.file_id, question=body.question, exact=body.exact)
+
+    async def work(job):
+        return await run_in_thread(run_analysis, analysis_request)
+
+    job = job_scheduler.submit("analyze", _client_id(request), body.priority, work)
+    return _job_response(job, status_code=202)
+
+@router.get("/jobs/stats")
+async def get_job_stats() -> JSONResponse:
+    """
+    Get scheduler queue and worker counters
+    """
+    return JSONResponse(
+        status_code=200,
+        content={
+            "success": True,
+            "data": job_scheduler.stats()
+        }
+    )
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str) -> JSONResponse:
+    """
+    Get the status and progress of a job
+    """
+    return _job_response(_get_job(job_id))
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str) -> JSONResponse:
+    """
+    Fetch the result of a finished job
+    """
+    job = _get_job(job_id)
+
+    if job.status == "succeeded":
+        return JSONResponse(
+            status_code=200,
+            content={
+                "success": True,
+                "data": job.result
+            }
+        )
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"Job failed: {job.error}")
+    if job.status == "cancelled":
+        raise HTTPException(status_code=410, detail="Job was cancelled")
+    raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str) -> JSONResponse:
+    """
+    Cancel a queued or running job
+    """
+    _get_job(job_id)
+    return _job_response(job_scheduler.cancel(job_id))
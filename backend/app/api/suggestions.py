@@ -3,8 +3,11 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any
 import pandas as pd
+import asyncio
 from ..api.upload import file_storage
 from ..services.llm_service import llm_service
+from ..services.llm_client import llm_client
+from ..services.lookup_index import lookup_store
 
 router = APIRouter()
 
@@ -52,10 +55,15 @@ async def get_suggestions(request: SuggestionRequest) -> JSONResponse:
         if request.file_id not in file_storage:
             raise HTTPException(status_code=404, detail="File not found")
         
-        df = file_storage[request.file_id]
+        # Spilled datasets are reloaded from disk in a worker thread
+        df = await asyncio.to_thread(file_storage.get, request.file_id)
         
-        # Get suggestions from LLM service
-        result = llm_service.get_questions_for_category(request.category, df)
+        # Get suggestions from LLM service; run on the LLM client's threads so
+        # requests waiting on the provider's rate limits block neither the
+        # event loop nor the worker threads other endpoints use
+        result = await llm_client.run(
+            llm_service.get_questions_for_category, request.category, df, lookup_store.get(request.file_id)
+        )
         
         return JSONResponse(
             status_code=200,
@@ -84,10 +92,13 @@ async def get_default_suggestions(file_id: str) -> JSONResponse:
         if file_id not in file_storage:
             raise HTTPException(status_code=404, detail="File not found")
         
-        df = file_storage[file_id]
+        # Spilled datasets are reloaded from disk in a worker thread
+        df = await asyncio.to_thread(file_storage.get, file_id)
         
         # Get default suggestions (learn category)
-        result = llm_service.get_questions_for_category("learn", df)
+        result = await llm_client.run(
+            llm_service.get_questions_for_category, "learn", df, lookup_store.get(file_id)
+        )
         
         return JSONResponse(
             status_code=200,
@@ -101,4 +112,15 @@ async def get_default_suggestions(file_id: str) -> JSONResponse:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to generate suggestions: {str(e)}"
-        ) 
\ No newline at end of file
+        )
+
+@router.get("/llm/stats")
+async def get_llm_stats() -> JSONResponse:
+    """Get queue wait and rejection counters for the LLM provider"""
+    return JSONResponse(
+        status_code=200,
+        content={
+            "success": True,
+            "data": llm_client.stats()
+        }
+    )
@@ -1,53 +1,168 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from fastapi.responses import JSONResponse
 import pandas as pd
 import io
 import uuid
-from typing import Dict, Any
+import asyncio
+import itertools
+from typing import Callable, Dict, Any, Optional
 from ..models.file import FileInfo
+from ..services.index_service import index_manager
+from ..services.sketches import sketch_store
+from ..services.result_cache import result_cache
+from ..services.memory_governor import memory_governor, AdmissionRejected
+from ..services.date_detection import date_detector
+from ..services.time_rollups import rollup_store
+from ..services.lookup_index import lookup_store
+from ..services.job_queue import run_in_thread
+from ..services.file_parser import (
+    UnsupportedUpload, estimated_raw_bytes, is_supported, parse_metrics, parse_payload, read_upload
+)
 
 router = APIRouter()
 
-# In-memory storage for demo (replace with database in production)
-file_storage: Dict[str, pd.DataFrame] = {}
+# In-memory storage for demo (replace with database in production). Datasets
+# are held within the memory governor's budget and spilled to disk beyond it.
+file_storage = memory_governor.datasets
 
-@router.post("/upload")
-async def upload_file(file: UploadFile = File(...)) -> JSONResponse:
+# Bumped whenever a dataset's contents change; cached results are keyed by it
+dataset_versions: Dict[str, int] = {}
+_version_counter = itertools.count(1)
+
+def store_dataset(file_id: str, df: pd.DataFrame) -> None:
+    """Store (or replace) a dataset under a new version"""
+    file_storage[file_id] = df
+    dataset_versions[file_id] = next(_version_counter)
+    result_cache.invalidate(file_id)
+
+def drop_dataset(file_id: str) -> None:
+    """Remove a dataset and everything derived from it"""
+    file_storage.pop(file_id, None)
+    dataset_versions.pop(file_id, None)
+    index_manager.drop(file_id)
+    sketch_store.drop(file_id)
+    rollup_store.drop(file_id)
+    lookup_store.drop(file_id)
+    result_cache.invalidate(file_id)
+
+def _on_evict(file_id: str, spilled: bool) -> None:
+    """Release what an evicted dataset leaves behind"""
+    # Built indexes reference the frame and would keep it in memory
+    index_manager.release(file_id)
+    if not spilled:
+        drop_dataset(file_id)
+
+def _derived_bytes() -> int:
+    """Memory held by structures built from datasets, spilled ones included"""
+    return index_manager.nbytes() + sketch_store.nbytes() + rollup_store.nbytes() + lookup_store.nbytes()
+
+memory_governor.on_evict = _on_evict
+memory_governor.derived_bytes = _derived_bytes
+
+def _upload_size(file: UploadFile) -> int:
+    """Size of an upload in bytes, measured from its spooled file when not given"""
+    if file.size is not None:
+        return file.size
+    position = file.file.tell()
+    file.file.seek(0, io.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(position)
+    return size
+
+async def ingest_upload(
+    file: UploadFile,
+    index_columns: Optional[str] = None,
+    progress: Optional[Callable[[float], None]] = None
+) -> FileInfo:
     """
-    Upload a CSV or Excel file for analysis
+    Validate, admit, parse and store an uploaded file.
+    
+    Shared by the /upload endpoint and upload jobs; ``progress`` is called
+    with the completed fraction as the upload moves through its stages.
     """
-    try:
-        # Validate file type
-        if not file.filename.lower().endswith(('.csv', '.xlsx', '.xls')):
-            raise HTTPException(
-                status_code=400, 
-                detail="Only CSV and Excel files are supported"
-            )
+    report = progress or (lambda fraction: None)
+    
+    # Validate file type (optionally gzip/zstd compressed, or zipped)
+    if not is_supported(file.filename):
+        raise HTTPException(
+            status_code=400, 
+            detail="Only CSV and Excel files (optionally .gz, .zst or .zip compressed) are supported"
+        )
+    
+    # Admit the upload against the memory budget before reading and parsing it
+    upload_size = _upload_size(file)
+    estimate = memory_governor.estimate_parsed_bytes(estimated_raw_bytes(file.filename, upload_size))
+    
+    async with memory_governor.admit(estimate) as reservation:
+        # Compressed uploads were admitted on an assumed ratio; the reservation
+        # follows the real decompressed size as it streams in
+        async def track_raw_bytes(raw_bytes: int) -> None:
+            await reservation.grow(memory_governor.estimate_parsed_bytes(raw_bytes))
         
-        # Read file content
-        content = await file.read()
+        # Stream the upload, decompressing it on the fly
+        payload = await read_upload(file, track_raw_bytes)
+        report(0.2)
         
-        # Parse based on file type
-        if file.filename.lower().endswith('.csv'):
-            df = pd.read_csv(io.StringIO(content.decode('utf-8')))
-        else:
-            df = pd.read_excel(io.BytesIO(content))
+        # Parse off the event loop so other requests keep being served. A
+        # cancelled job waits for the running stage, so the reservation is
+        # held until the thread is done with the frame
+        df, metrics = await run_in_thread(parse_payload, payload)
         
-        # Generate unique file ID
-        file_id = str(uuid.uuid4())
+        # Text columns holding dates are parsed with an inferred format
+        df, metrics["date_formats"] = await run_in_thread(date_detector.parse, df)
+        report(0.8)
+    
+    # Generate unique file ID
+    file_id = str(uuid.uuid4())
+    
+    try:
+        # Store in memory (replace with database in production). The reservation
+        # is released first so the frame is not counted twice: the store measures
+        # it and evicts other datasets to make room, both off the event loop
+        await run_in_thread(store_dataset, file_id, df)
         
-        # Store in memory (replace with database in production)
-        file_storage[file_id] = df
+        # Large datasets are summarized in one pass for approximate answers
+        await run_in_thread(sketch_store.build, file_id, df)
         
-        # Create file info
-        file_info = FileInfo(
-            id=file_id,
-            name=file.filename,
-            size=len(content),
-            type=file.content_type or "application/octet-stream",
-            columns=df.columns.tolist(),
-            row_count=len(df)
-        )
+        # Trend questions are answered from day/week/month rollups
+        await run_in_thread(rollup_store.build, file_id, df)
+        
+        # Question words are mapped to columns and values through an inverted index
+        await run_in_thread(lookup_store.build, file_id, df)
+    except asyncio.CancelledError:
+        # A cancelled upload leaves nothing behind
+        drop_dataset(file_id)
+        raise
+    
+    # Indexes are built lazily on the first filtered question
+    if index_columns:
+        index_manager.configure(file_id, [c.strip() for c in index_columns.split(",") if c.strip()])
+    report(1.0)
+    
+    # Create file info
+    return FileInfo(
+        id=file_id,
+        name=file.filename,
+        size=upload_size,
+        type=file.content_type or "application/octet-stream",
+        columns=df.columns.tolist(),
+        row_count=len(df),
+        metrics=metrics
+    )
+
+@router.post("/upload")
+async def upload_file(
+    file: UploadFile = File(...),
+    index_columns: Optional[str] = Form(None)
+) -> JSONResponse:
+    """
+    Upload a CSV or Excel file for analysis.
+    
+    ``index_columns`` optionally lists (comma separated) the columns to index
+    for filtered questions; by default they are auto-detected.
+    """
+    try:
+        file_info = await ingest_upload(file, index_columns)
         
         return JSONResponse(
             status_code=200,
@@ -57,6 +172,19 @@ async def upload_file(file: UploadFile = File(...)) -> JSONResponse:
             }
         )
         
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"File upload rejected: {str(e)}",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except UnsupportedUpload as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File upload failed: {str(e)}"
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -71,7 +199,10 @@ async def get_file_info(file_id: str) -> JSONResponse:
     if file_id not in file_storage:
         raise HTTPException(status_code=404, detail="File not found")
     
-    df = file_storage[file_id]
+    # Spilled datasets are reloaded from disk in a worker thread
+    df = await asyncio.to_thread(file_storage.get, file_id)
+    if df is None:
+        raise HTTPException(status_code=404, detail="File not found")
     
     file_info = FileInfo(
         id=file_id,
@@ -88,4 +219,48 @@ async def get_file_info(file_id: str) -> JSONResponse:
             "success": True,
             "data": file_info.dict()
         }
-    ) 
\ No newline at end of file
+    )
+
+@router.delete("/files/{file_id}")
+async def delete_file(file_id: str) -> JSONResponse:
+    """
+    Delete an uploaded file along with its indexes
+    """
+    if file_id not in file_storage:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    drop_dataset(file_id)
+    
+    return JSONResponse(
+        status_code=200,
+        content={
+            "success": True,
+            "data": {"id": file_id}
+        }
+    )
+
+@router.get("/memory/stats")
+async def get_memory_stats() -> JSONResponse:
+    """
+    Get dataset memory usage and upload admission counters
+    """
+    return JSONResponse(
+        status_code=200,
+        content={
+            "success": True,
+            "data": memory_governor.stats()
+        }
+    )
+
+@router.get("/upload/metrics")
+async def get_upload_metrics() -> JSONResponse:
+    """
+    Get read and parse throughput (MB/s) per upload path, e.g. "gzip+csv"
+    """
+    return JSONResponse(
+        status_code=200,
+        content={
+            "success": True,
+            "data": parse_metrics.summary()
+        }
+    )
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 class FileInfo(BaseModel):
@@ -9,4 +9,5 @@ class FileInfo(BaseModel):
     type: str
     columns: List[str]
     row_count: int
+    metrics: Optional[Dict[str, Any]] = None  # Ingest path, sniffed format and throughput
     uploaded_at: str = Field(default_factory=lambda: datetime.now().isoformat()) 
\ No newline at end of file
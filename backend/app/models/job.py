@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from typing import Optional
+
+class JobInfo(BaseModel):
+    id: str
+    kind: str
+    priority: str
+    status: str
+    progress: float
+    error: Optional[str] = None
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
@@ -0,0 +1,84 @@
+import warnings
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, List, Optional
+
+class FrameAggregates:
+    """
+    Memoized column aggregates over one (possibly filtered) frame.
+
+    Batch analysis registers every question's needs with ``request`` before
+    answering any of them, so the first lookup computes them together: one
+    vectorized pass over the numeric block yields the means and every
+    requested quantile, and each categorical column is hashed once for both
+    its distinct count and its value counts. Single questions use the same
+    object and simply compute what they ask for.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.passes = 0
+        self._pending_numeric: List[str] = []
+        self._pending_quantiles: set = set()
+        self._pending_counts: List[str] = []
+        self._means: Dict[str, float] = {}
+        self._quantiles: Dict[float, Dict[str, float]] = {}
+        self._value_counts: Dict[str, pd.Series] = {}
+
+    def request(self, means: Iterable[str] = (), quantiles: Optional[Dict[float, List[str]]] = None,
+                distinct: Iterable[str] = (), value_counts: Iterable[str] = ()) -> None:
+        """Register aggregates that will be looked up later"""
+        self._pending_numeric.extend(means)
+        for q, columns in (quantiles or {}).items():
+            self._pending_quantiles.add(q)
+            self._pending_numeric.extend(columns)
+        self._pending_counts.extend(distinct)
+        self._pending_counts.extend(value_counts)
+
+    def mean(self, columns: List[str]) -> Dict[str, float]:
+        if any(c not in self._means for c in columns):
+            self._numeric_pass(columns)
+        return {c: self._means[c] for c in columns}
+
+    def quantile(self, columns: List[str], q: float) -> Dict[str, float]:
+        computed = self._quantiles.get(q, {})
+        if any(c not in computed for c in columns):
+            self._pending_quantiles.add(q)
+            self._numeric_pass(columns)
+        return {c: self._quantiles[q][c] for c in columns}
+
+    def nunique(self, columns: List[str]) -> Dict[str, int]:
+        return {c: int(len(self.value_counts(c))) for c in columns}
+
+    def value_counts(self, column: str) -> pd.Series:
+        if column not in self._value_counts:
+            for c in dict.fromkeys(self._pending_counts + [column]):
+                if c not in self._value_counts:
+                    self._value_counts[c] = self.df[c].value_counts()
+            self._pending_counts = []
+        return self._value_counts[column]
+
+    def _numeric_pass(self, columns: List[str]) -> None:
+        """Compute means and all pending quantiles for the pending columns in one pass"""
+        columns = list(dict.fromkeys(self._pending_numeric + list(columns)))
+        quantiles = sorted(self._pending_quantiles)
+        self._pending_numeric = []
+        self._pending_quantiles = set()
+
+        block = self.df[columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        counts = np.sum(~np.isnan(block), axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.nansum(block, axis=0) / counts
+        self._means.update(zip(columns, means.tolist()))
+
+        if quantiles:
+            if len(block):
+                # All-NaN columns have no quantile; numpy warns and returns NaN
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    values = np.nanquantile(block, quantiles, axis=0)
+            else:
+                values = np.full((len(quantiles), len(columns)), np.nan)
+            for q, row in zip(quantiles, values):
+                self._quantiles.setdefault(q, {}).update(zip(columns, row.tolist()))
+        self.passes += 1
@@ -0,0 +1,177 @@
+import os
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Sequence
+
+COLORS = ["#3B82F6", "#10B981", "#F59E0B", "#EF4444", "#8B5CF6"]
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the positions of ``threshold`` points that preserve the visual
+    shape of the series; ``x`` must be sorted ascending.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    every = (n - 2) / (threshold - 2)
+    edges = (np.arange(threshold - 1) * every).astype(np.intp) + 1
+    edges[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (the final point for the last bucket)
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        # Pick the point forming the largest triangle with the previous pick and that average
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def _json_values(values: np.ndarray) -> List[Any]:
+    """Convert an array to JSON-safe Python values (NaN becomes None)"""
+    return [None if v is None or (isinstance(v, float) and np.isnan(v)) else v for v in values.tolist()]
+
+def _axis_values(series: pd.Series) -> np.ndarray:
+    """Numeric representation of an axis used for downsampling"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(np.float64)
+    return series.to_numpy(dtype=np.float64)
+
+def _axis_labels(series: pd.Series) -> List[Any]:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.strftime("%Y-%m-%d").tolist()
+    return _json_values(series.to_numpy())
+
+class ChartBuilder:
+    """Builds Chart.js payloads whose size is bounded regardless of row count"""
+
+    def __init__(self):
+        self.max_points = int(os.getenv("CHART_MAX_POINTS", "1000"))
+        self.histogram_bins = int(os.getenv("CHART_HISTOGRAM_BINS", "30"))
+        self.max_bars = int(os.getenv("CHART_MAX_BARS", "20"))
+
+    def _options(self, title: str) -> Dict[str, Any]:
+        return {
+            "responsive": True,
+            "plugins": {
+                "legend": {"position": "top"},
+                "title": {"display": True, "text": title}
+            }
+        }
+
+    def bar(self, labels: Sequence[Any], values: Sequence[float], label: str,
+            other_total: float = 0, title: str = "Analysis Results",
+            additive: bool = True) -> Dict[str, Any]:
+        """
+        Bar chart capped at ``max_bars`` bars.
+
+        Additive values (counts, sums) beyond the cap are summed into an
+        "Other" bar; values that do not add up, such as averages, are simply
+        truncated.
+        """
+        labels, values = list(labels), list(values)
+        if len(labels) > self.max_bars:
+            if additive:
+                other_total += float(np.sum(values[self.max_bars:]))
+            labels, values = labels[:self.max_bars], values[:self.max_bars]
+        if other_total and additive:
+            labels.append("Other")
+            values.append(other_total)
+        return {
+            "type": "bar",
+            "data": {
+                "labels": [str(l) for l in labels],
+                "datasets": [{
+                    "label": label,
+                    "data": values,
+                    "backgroundColor": COLORS
+                }]
+            },
+            "options": self._options(title)
+        }
+
+    def line(self, df: pd.DataFrame, x: Optional[str], columns: List[str],
+             title: str = "Trend") -> Dict[str, Any]:
+        """Line chart of one or more columns, downsampled with LTTB"""
+        frame = df[[x] + columns] if x else df[columns]
+        frame = frame.dropna()
+        if x:
+            frame = frame.sort_values(x, kind="stable")
+            x_values = _axis_values(frame[x])
+        else:
+            x_values = np.arange(len(frame), dtype=np.float64)
+
+        # Choose points on the first series so every series shares the same x positions
+        keep = lttb(x_values, frame[columns[0]].to_numpy(dtype=np.float64), self.max_points)
+        sampled = frame.iloc[keep]
+        labels = _axis_labels(sampled[x]) if x else (keep + 1).tolist()
+        return {
+            "type": "line",
+            "data": {
+                "labels": labels,
+                "datasets": [{
+                    "label": col,
+                    "data": _json_values(sampled[col].to_numpy(dtype=np.float64)),
+                    "borderColor": COLORS[i % len(COLORS)],
+                    "pointRadius": 0
+                } for i, col in enumerate(columns)]
+            },
+            "options": self._options(title)
+        }
+
+    def scatter(self, df: pd.DataFrame, x: str, y: str, title: str = "Relationship") -> Dict[str, Any]:
+        """Scatter chart of two numeric columns, downsampled with LTTB along x"""
+        frame = df[[x, y]].dropna().sort_values(x, kind="stable")
+        x_values = _axis_values(frame[x])
+        y_values = frame[y].to_numpy(dtype=np.float64)
+        keep = lttb(x_values, y_values, self.max_points)
+        return {
+            "type": "scatter",
+            "data": {
+                "datasets": [{
+                    "label": f"{y} vs {x}",
+                    "data": [{"x": a, "y": b} for a, b in zip(x_values[keep].tolist(), y_values[keep].tolist())],
+                    "backgroundColor": COLORS[0]
+                }]
+            },
+            "options": self._options(title)
+        }
+
+    def histogram(self, values: pd.Series, label: str) -> Dict[str, Any]:
+        """Fixed-bin histogram of a numeric column"""
+        counts, edges = self.histogram_counts(values)
+        return {
+            "type": "bar",
+            "data": {
+                "labels": [f"{lo:.4g} – {hi:.4g}" for lo, hi in zip(edges[:-1], edges[1:])],
+                "datasets": [{
+                    "label": label,
+                    "data": counts.tolist(),
+                    "backgroundColor": COLORS[0]
+                }]
+            },
+            "options": {
+                **self._options(f"Distribution of {label}"),
+                "scales": {"x": {"ticks": {"autoSkip": True}}}
+            }
+        }
+
+    def histogram_counts(self, values: pd.Series):
+        """Vectorized fixed-bin counts over the finite values of a column"""
+        data = pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64)
+        data = data[np.isfinite(data)]
+        if len(data) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(1)
+        return np.histogram(data, bins=self.histogram_bins)
+
+# Global instance
+chart_builder = ChartBuilder()
@@ -0,0 +1,143 @@
+import os
+import re
+import threading
+import warnings
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# Candidate formats tried in order; month-first wins ties on ambiguous dates
+DATE_FORMATS = [
+    "%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S%z", "%Y/%m/%d", "%m/%d/%Y", "%d/%m/%Y", "%m/%d/%Y %H:%M", "%d/%m/%Y %H:%M",
+    "%m/%d/%y", "%d/%m/%y", "%d.%m.%Y", "%m-%d-%Y", "%d-%m-%Y", "%Y%m%d", "%b %d, %Y", "%d %b %Y",
+    "%B %d, %Y", "%d %B %Y", "%Y-%m"
+]
+
+# Strings must look roughly like a date before any format is tried
+DATE_LIKE = re.compile(r"^\s*(\d{1,4}[-/.]\d{1,2}([-/.]\d{1,4})?|\d{8}|[A-Za-z]{3,9}\.? \d{1,2},? \d{4}|\d{1,2} [A-Za-z]{3,9}\.? \d{4})")
+
+def _shape(value: str) -> str:
+    """Digits and letters collapsed, e.g. "2024-01-31" -> "9999-99-99" """
+    return re.sub(r"[A-Za-z]+", "a", re.sub(r"\d", "9", value.strip()))
+
+def _parse_ratio(values: List[str], fmt: str) -> float:
+    parsed = 0
+    for value in values:
+        try:
+            datetime.strptime(value.strip(), fmt)
+            parsed += 1
+        except ValueError:
+            pass
+    return parsed / len(values)
+
+class DateDetector:
+    """
+    Finds text columns holding dates and parses them with an explicit format.
+
+    Each candidate column's format is inferred from a small sample and then
+    applied in one vectorized ``to_datetime`` call over the column's distinct
+    values. The inferred format is cached per column name and value shape, so
+    re-uploads and datasets with the same layout only verify it against the
+    sample.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("DETECT_DATES", "true").lower() == "true"
+        self.sample_size = int(os.getenv("DATE_DETECT_SAMPLE", "200"))
+        self.min_ratio = float(os.getenv("DATE_DETECT_MIN_RATIO", "0.95"))
+        self.cache_size = 1024
+        self._formats: "OrderedDict[Tuple[str, str], Optional[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def infer_format(self, column: str, series: pd.Series) -> Optional[str]:
+        """Infer a strptime format for a text column, or None if it does not hold dates"""
+        sample = series.head(self.sample_size * 10).dropna()
+        sample = sample.drop_duplicates().head(self.sample_size).astype(str).tolist()
+        if not sample or sum(1 for v in sample if DATE_LIKE.match(v)) < self.min_ratio * len(sample):
+            return None
+
+        key = (column, _shape(sample[0]))
+        with self._lock:
+            cached = self._formats.get(key)
+        if cached is not None and _parse_ratio(sample, cached) >= self.min_ratio:
+            with self._lock:
+                self._formats.move_to_end(key)
+                self.cache_hits += 1
+            return cached
+
+        best, best_ratio = None, 0.0
+        for fmt in DATE_FORMATS:
+            ratio = _parse_ratio(sample, fmt)
+            if ratio > best_ratio:
+                best, best_ratio = fmt, ratio
+            if ratio == 1.0:
+                break
+        fmt = best if best_ratio >= self.min_ratio else None
+        with self._lock:
+            self.cache_misses += 1
+            if fmt is not None:
+                self._formats[key] = fmt
+                if len(self._formats) > self.cache_size:
+                    self._formats.popitem(last=False)
+        return fmt
+
+    def parse(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, str]]:
+        """Convert detected date columns in place; returns the frame and column formats"""
+        formats: Dict[str, str] = {}
+        if not self.enabled:
+            return df, formats
+        for column in df.columns:
+            series = df[column]
+            if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+                continue
+            fmt = self.infer_format(str(column), series)
+            if fmt is None:
+                continue
+            # Dates repeat heavily, so each distinct string is parsed once and
+            # the results are gathered back by factorized code
+            codes, uniques = pd.factorize(series)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                # Offsets are normalized to naive UTC so mixed offsets still share a dtype
+                parsed_uniques = pd.to_datetime(pd.Series(uniques), format=fmt, errors="coerce", utc="%z" in fmt)
+            if isinstance(parsed_uniques.dtype, pd.DatetimeTZDtype):
+                parsed_uniques = parsed_uniques.dt.tz_localize(None)
+            # Code -1 (missing) picks the trailing NaT
+            lookup = np.append(parsed_uniques.to_numpy(dtype="datetime64[ns]"), np.datetime64("NaT", "ns"))
+            parsed = pd.Series(lookup[codes], index=series.index)
+            # The sample can miss malformed rows; keep the text if too many fail
+            if parsed.notna().sum() < self.min_ratio * series.notna().sum():
+                continue
+            df[column] = parsed
+            formats[str(column)] = fmt
+        return df, formats
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cached_formats": len(self._formats),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses
+        }
+
+def iso_values(values: pd.Index) -> List[Any]:
+    """Index values as JSON-safe Python values; datetimes become ISO strings"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return [v.isoformat() if pd.notna(v) else None for v in values]
+    return values.tolist()
+
+def iso_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Rows as records with datetime columns rendered as ISO strings"""
+    date_cols = [c for c in df.columns if pd.api.types.is_datetime64_any_dtype(df[c])]
+    if date_cols:
+        df = df.copy()
+        for col in date_cols:
+            df[col] = pd.Series(iso_values(pd.Index(df[col])), index=df.index, dtype=object)
+    return df.to_dict('records')
+
+# Global instance
+date_detector = DateDetector()
@@ -0,0 +1,284 @@
+import os
+import csv
+import asyncio
+import time
+import zlib
+import codecs
+import zipfile
+import tempfile
+import threading
+import pandas as pd
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstd uploads are rejected without the optional package
+    zstandard = None
+
+TABLE_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.zst': 'zstd', '.zip': 'zip'}
+
+CHUNK_SIZE = 1024 * 1024
+SNIFF_BYTES = 64 * 1024
+# Decompressed uploads stay in memory up to this size, then move to disk
+SPOOL_MAX_MEMORY = 32 * 1024 * 1024
+# Assumed expansion of compressed uploads when sizing them before reading
+COMPRESSION_RATIO = float(os.getenv("COMPRESSED_UPLOAD_RATIO", "6"))
+# Largest decompressed upload accepted, however well it compressed
+MAX_RAW_BYTES = int(os.getenv("MAX_FILE_SIZE", str(50 * 1024 * 1024)))
+
+class UnsupportedUpload(ValueError):
+    """Raised for uploads whose format or compression cannot be read"""
+    pass
+
+def split_compression(filename: str) -> Tuple[str, Optional[str]]:
+    """Split "data.csv.gz" into ("data.csv", "gzip"); plain names get no codec"""
+    lower = filename.lower()
+    for extension, codec in COMPRESSION_EXTENSIONS.items():
+        if lower.endswith(extension):
+            return filename[:-len(extension)], codec
+    return filename, None
+
+def estimated_raw_bytes(filename: str, size: int) -> int:
+    """Estimate the decompressed size of an upload from its name and byte size"""
+    _, codec = split_compression(filename)
+    return int(size * COMPRESSION_RATIO) if codec else size
+
+def is_supported(filename: str) -> bool:
+    inner, codec = split_compression(filename)
+    # Zip members are checked once the archive is open
+    return codec == 'zip' or inner.lower().endswith(TABLE_EXTENSIONS)
+
+class _Decompressor:
+    """Incremental decompressor with a common feed/flush interface"""
+
+    def __init__(self, codec: str):
+        self.codec = codec
+        if codec == 'gzip':
+            self._obj = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif codec == 'zstd':
+            if zstandard is None:
+                raise UnsupportedUpload("zstd uploads require the zstandard package")
+            self._obj = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            raise UnsupportedUpload(f"Unsupported compression: {codec}")
+
+    def feed(self, chunk: bytes) -> bytes:
+        try:
+            out = self._obj.decompress(chunk)
+            # Concatenated gzip members ("cat a.gz b.gz") each need a fresh decompressor
+            while self.codec == 'gzip' and self._obj.eof and self._obj.unused_data:
+                rest = self._obj.unused_data
+                self._obj = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                out += self._obj.decompress(rest)
+        except self._errors as e:
+            raise UnsupportedUpload(f"Invalid {self.codec} data: {e}")
+        return out
+
+    def flush(self) -> bytes:
+        if self.codec != 'gzip':
+            return b""
+        if not self._obj.eof:
+            raise UnsupportedUpload("Invalid gzip data: stream is truncated")
+        return self._obj.flush()
+
+    @property
+    def _errors(self) -> tuple:
+        return (zlib.error, zstandard.ZstdError) if zstandard is not None else (zlib.error,)
+
+class UploadPayload:
+    """Decompressed upload bytes plus what was learned while streaming them"""
+
+    def __init__(self, name: str, codec: Optional[str], stream: BinaryIO,
+                 compressed_bytes: int, raw_bytes: int, read_seconds: float):
+        self.name = name
+        self.codec = codec
+        self.stream = stream
+        self.compressed_bytes = compressed_bytes
+        self.raw_bytes = raw_bytes
+        self.read_seconds = read_seconds
+
+    @property
+    def path(self) -> str:
+        """Ingest path label, e.g. "gzip+csv" or "xlsx" """
+        kind = os.path.splitext(self.name.lower())[1].lstrip('.')
+        return f"{self.codec}+{kind}" if self.codec else kind
+
+def _check_raw_bytes(raw_bytes: int) -> None:
+    if raw_bytes > MAX_RAW_BYTES:
+        raise UnsupportedUpload(
+            f"Decompressed upload exceeds the {MAX_RAW_BYTES // (1024 * 1024)} MB limit"
+        )
+
+async def read_upload(file, on_raw_bytes: Optional[Callable[[int], Awaitable[None]]] = None) -> UploadPayload:
+    """
+    Stream an upload into a spooled buffer, decompressing gzip/zstd on the fly.
+
+    Zip archives need random access, so they are spooled first and their first
+    CSV/Excel member is then streamed out. Decompressed bytes are counted as
+    they arrive: past MAX_RAW_BYTES the upload is rejected, and
+    ``on_raw_bytes`` is awaited with the running total so the caller can
+    grow its memory reservation (or reject the upload) before it is parsed.
+    """
+    start = time.perf_counter()
+    name, codec = split_compression(file.filename)
+    decompressor = _Decompressor(codec) if codec in ('gzip', 'zstd') else None
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    compressed_bytes = 0
+
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            compressed_bytes += len(chunk)
+            # Decompress in a worker thread so large uploads do not stall the event loop
+            data = await asyncio.to_thread(decompressor.feed, chunk) if decompressor else chunk
+            spool.write(data)
+            if codec != 'zip':
+                _check_raw_bytes(spool.tell())
+                if on_raw_bytes:
+                    await on_raw_bytes(spool.tell())
+        if decompressor:
+            spool.write(decompressor.flush())
+
+        if codec == 'zip':
+            spool, name = await asyncio.to_thread(_extract_zip_member, spool)
+            if on_raw_bytes:
+                await on_raw_bytes(spool.tell())
+    except BaseException:
+        spool.close()
+        raise
+
+    raw_bytes = spool.tell()
+    spool.seek(0)
+    return UploadPayload(name, codec, spool, compressed_bytes, raw_bytes, time.perf_counter() - start)
+
+def _extract_zip_member(archive: BinaryIO) -> Tuple[BinaryIO, str]:
+    archive.seek(0)
+    try:
+        with zipfile.ZipFile(archive) as zf:
+            member = next(
+                (m for m in zf.infolist() if not m.is_dir() and m.filename.lower().endswith(TABLE_EXTENSIONS)),
+                None
+            )
+            if member is None:
+                raise UnsupportedUpload("Zip archive contains no CSV or Excel file")
+            spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+            try:
+                with zf.open(member) as source:
+                    while True:
+                        chunk = source.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        spool.write(chunk)
+                        _check_raw_bytes(spool.tell())
+            except BaseException:
+                spool.close()
+                raise
+    except zipfile.BadZipFile as e:
+        raise UnsupportedUpload(f"Invalid zip archive: {e}")
+    finally:
+        archive.close()
+    return spool, os.path.basename(member.filename)
+
+def sniff_csv(sample: bytes) -> Tuple[str, str]:
+    """Infer encoding and delimiter from the first few KB of a CSV"""
+    if sample.startswith(codecs.BOM_UTF8):
+        encoding = 'utf-8-sig'
+    elif sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        encoding = 'utf-16'
+    else:
+        encoding = 'latin-1'
+        for candidate in ('utf-8', 'cp1252'):
+            try:
+                # Incremental decoding tolerates a multi-byte character cut off at the sample's end
+                codecs.getincrementaldecoder(candidate)().decode(sample, final=False)
+                encoding = candidate
+                break
+            except UnicodeDecodeError:
+                continue
+
+    text = sample.decode(encoding, errors='ignore')
+    # Only sniff whole lines so a truncated last row does not skew the counts
+    lines = text.splitlines()[:-1] or text.splitlines()
+    try:
+        delimiter = csv.Sniffer().sniff("\n".join(lines[:50]), delimiters=",;\t|").delimiter
+    except csv.Error:
+        header = lines[0] if lines else ""
+        delimiter = max(",;\t|", key=header.count) if header and any(d in header for d in ",;\t|") else ","
+    return encoding, delimiter
+
+def parse_payload(payload: UploadPayload) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Parse a decompressed upload; returns the frame and parse metrics"""
+    start = time.perf_counter()
+    details: Dict[str, Any] = {}
+    try:
+        if payload.name.lower().endswith('.csv'):
+            encoding, delimiter = sniff_csv(payload.stream.read(SNIFF_BYTES))
+            # The sample can be plain ASCII while a later row is not UTF-8, so
+            # fall back to the single-byte encodings (latin-1 decodes anything)
+            candidates = [encoding] + (['cp1252', 'latin-1'] if encoding == 'utf-8' else [])
+            for attempt, encoding in enumerate(candidates, 1):
+                payload.stream.seek(0)
+                try:
+                    df = pd.read_csv(payload.stream, encoding=encoding, sep=delimiter)
+                    break
+                except UnicodeDecodeError:
+                    if attempt == len(candidates):
+                        raise UnsupportedUpload(f"Could not decode the CSV file as {encoding}")
+            details = {"encoding": encoding, "delimiter": delimiter}
+        elif payload.name.lower().endswith(('.xlsx', '.xls')):
+            df = pd.read_excel(payload.stream)
+        else:
+            raise UnsupportedUpload("Only CSV and Excel files are supported")
+    finally:
+        payload.stream.close()
+    parse_seconds = time.perf_counter() - start
+
+    megabytes = payload.raw_bytes / (1024 * 1024)
+    metrics = {
+        "path": payload.path,
+        **details,
+        "compressed_bytes": payload.compressed_bytes,
+        "raw_bytes": payload.raw_bytes,
+        "read_seconds": round(payload.read_seconds, 4),
+        "parse_seconds": round(parse_seconds, 4),
+        "read_mb_per_s": round(megabytes / payload.read_seconds, 2) if payload.read_seconds else None,
+        "parse_mb_per_s": round(megabytes / parse_seconds, 2) if parse_seconds else None
+    }
+    parse_metrics.record(payload.path, payload.raw_bytes, payload.read_seconds, parse_seconds)
+    return df, metrics
+
+class ParseMetrics:
+    """Aggregate parse throughput per ingest path"""
+
+    def __init__(self):
+        self._paths: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, path: str, raw_bytes: int, read_seconds: float, parse_seconds: float) -> None:
+        with self._lock:
+            totals = self._paths.setdefault(
+                path, {"uploads": 0, "raw_bytes": 0, "read_seconds": 0.0, "parse_seconds": 0.0}
+            )
+            totals["uploads"] += 1
+            totals["raw_bytes"] += raw_bytes
+            totals["read_seconds"] += read_seconds
+            totals["parse_seconds"] += parse_seconds
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            summary = {}
+            for path, totals in self._paths.items():
+                megabytes = totals["raw_bytes"] / (1024 * 1024)
+                summary[path] = {
+                    "uploads": totals["uploads"],
+                    "raw_mb": round(megabytes, 2),
+                    "read_mb_per_s": round(megabytes / totals["read_seconds"], 2) if totals["read_seconds"] else None,
+                    "parse_mb_per_s": round(megabytes / totals["parse_seconds"], 2) if totals["parse_seconds"] else None
+                }
+            return summary
+
+# Global instance
+parse_metrics = ParseMetrics()
@@ -0,0 +1,347 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
+from .query_parser import fold_text
+
+class HashIndex:
+    """
+    Hash index mapping each distinct value of a column to its row positions.
+
+    Stored in CSR layout: row positions grouped by value in one array, an
+    offsets array delimiting each value's group, and a ``pd.Index`` of the
+    (folded) keys, so memory stays proportional to the row count.
+    """
+
+    def __init__(self, series: pd.Series):
+        self.is_text = _is_text(series)
+
+        self._rows = len(series)
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        if self.is_text:
+            # Text values differing only by case/spacing share one folded key
+            key_codes, keys = pd.factorize(pd.Index([fold_text(v) for v in uniques], dtype=object))
+            codes = np.where(codes >= 0, key_codes[np.maximum(codes, 0)], -1)
+            # The first spelling seen for each key is reported back as the stored value
+            first = np.unique(key_codes, return_index=True)[1]
+            self._stored = pd.Index(uniques).take(first)
+        else:
+            keys = uniques
+            self._stored = pd.Index(uniques)
+        self._keys = pd.Index(keys)
+
+        # A stable argsort groups positions per key in ascending row order
+        valid = codes >= 0
+        self._order = np.flatnonzero(valid)[np.argsort(codes[valid], kind="stable")]
+        counts = np.bincount(codes[valid], minlength=len(self._keys))
+        self._offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def _key(self, value: Any) -> Any:
+        if self.is_text:
+            return fold_text(value)
+        if isinstance(value, (np.generic,)):
+            return value.item()
+        return value
+
+    def _code(self, value: Any) -> int:
+        try:
+            return int(self._keys.get_indexer([self._key(value)])[0])
+        except (TypeError, ValueError):
+            return -1
+
+    def __contains__(self, value: Any) -> bool:
+        return self._code(value) >= 0
+
+    def lookup(self, value: Any) -> np.ndarray:
+        """Return the sorted row positions holding ``value``"""
+        code = self._code(value)
+        if code < 0:
+            return np.empty(0, dtype=np.intp)
+        return self._order[self._offsets[code]:self._offsets[code + 1]]
+
+    def exclude(self, value: Any) -> np.ndarray:
+        """Return the sorted positions of non-null rows not holding ``value``"""
+        keep = np.zeros(self._rows, dtype=bool)
+        keep[self._order] = True
+        keep[self.lookup(value)] = False
+        return np.flatnonzero(keep)
+
+    def stored_value(self, value: Any) -> Any:
+        """The value as stored in the column, or None if absent"""
+        code = self._code(value)
+        if code < 0:
+            return None
+        stored = self._stored[code]
+        return stored.item() if isinstance(stored, np.generic) else stored
+
+    @property
+    def distinct_count(self) -> int:
+        return len(self._keys)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self._order.nbytes + self._offsets.nbytes + self._keys.memory_usage(deep=True))
+
+class SortedIndex:
+    """Sorted index over a numeric or datetime column for range predicates"""
+
+    def __init__(self, series: pd.Series):
+        self.is_datetime = pd.api.types.is_datetime64_any_dtype(series)
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            series = series.dt.tz_localize(None)
+        values = series.to_numpy()
+        valid = ~pd.isna(values)
+        positions = np.flatnonzero(valid)
+        order = np.argsort(values[valid], kind="stable")
+        self._values = values[valid][order]
+        self._positions = positions[order]
+
+    def _coerce(self, value: Any) -> Any:
+        if self.is_datetime:
+            # str() lets a bare year such as 2023 mean 2023-01-01
+            return np.datetime64(pd.Timestamp(str(value)).tz_localize(None), "ns")
+        if isinstance(value, str):
+            raise TypeError(f"Cannot compare numeric column with '{value}'")
+        return value
+
+    def range(self, low: Any = None, high: Any = None,
+              low_inclusive: bool = True, high_inclusive: bool = True) -> np.ndarray:
+        """Return the sorted row positions whose value falls within [low, high]"""
+        start, end = 0, len(self._values)
+        if low is not None:
+            start = np.searchsorted(self._values, self._coerce(low), side="left" if low_inclusive else "right")
+        if high is not None:
+            end = np.searchsorted(self._values, self._coerce(high), side="right" if high_inclusive else "left")
+        if start >= end:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(self._positions[start:end])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self._values.nbytes + self._positions.nbytes)
+
+class DatasetIndex:
+    """Lazily built hash and sorted indexes for one dataset"""
+
+    def __init__(self, df: pd.DataFrame, columns: Optional[List[str]] = None,
+                 max_distinct_ratio: float = 0.1, sample_rows: int = 10000):
+        self.df = df
+        self.max_distinct_ratio = max_distinct_ratio
+        self.sample_rows = sample_rows
+        self.hash_columns = self._detect_hash_columns(columns)
+        self.sorted_columns = self._detect_sorted_columns(columns)
+        self.hash_indexes: Dict[str, HashIndex] = {}
+        self.sorted_indexes: Dict[str, SortedIndex] = {}
+        self._lock = threading.Lock()
+
+    def _distinct_ratio(self, series: pd.Series) -> float:
+        """Estimate distinct values per row from a sample; near 1 for ID-like columns"""
+        sample = series.head(self.sample_rows).dropna()
+        return sample.nunique() / len(sample) if len(sample) else 1.0
+
+    def _detect_hash_columns(self, columns: Optional[List[str]]) -> List[str]:
+        if columns:
+            return [c for c in columns if c in self.df.columns]
+        detected = []
+        for col in self.df.columns:
+            series = self.df[col]
+            if pd.api.types.is_float_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+                continue
+            # Text is always indexed: a scan folds every distinct value, which is
+            # costliest for ID-like columns such as customer names. Numeric
+            # equality scans are a cheap vectorized compare, so near-unique
+            # numeric columns are left to them
+            if _is_text(series) or self._distinct_ratio(series) <= self.max_distinct_ratio:
+                detected.append(col)
+        return detected
+
+    def _detect_sorted_columns(self, columns: Optional[List[str]]) -> List[str]:
+        candidates = columns or list(self.df.columns)
+        return [
+            col for col in candidates
+            if col in self.df.columns and (
+                (pd.api.types.is_numeric_dtype(self.df[col]) and not pd.api.types.is_bool_dtype(self.df[col]))
+                or pd.api.types.is_datetime64_any_dtype(self.df[col])
+            )
+        ]
+
+    def hash_index(self, column: str) -> Optional[HashIndex]:
+        """Return the hash index for a column, building it on first use"""
+        if column not in self.hash_columns:
+            return None
+        with self._lock:
+            if column not in self.hash_indexes:
+                self.hash_indexes[column] = HashIndex(self.df[column])
+            return self.hash_indexes[column]
+
+    def sorted_index(self, column: str) -> Optional[SortedIndex]:
+        """Return the sorted index for a column, building it on first use"""
+        if column not in self.sorted_columns:
+            return None
+        with self._lock:
+            if column not in self.sorted_indexes:
+                self.sorted_indexes[column] = SortedIndex(self.df[column])
+            return self.sorted_indexes[column]
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            indexes = list(self.hash_indexes.values()) + list(self.sorted_indexes.values())
+        return sum(index.nbytes for index in indexes)
+
+    def stored_value(self, column: str, value: Any) -> Any:
+        """The column's own spelling of ``value``, or None if the column does not hold it"""
+        index = self.hash_index(column)
+        if index is not None:
+            return _as_reported(index.stored_value(value), value)
+        return _scan_stored_value(self.df[column], value)
+
+    def filter_positions(self, filters: List[Dict[str, Any]]) -> np.ndarray:
+        """Resolve filters to the sorted row positions matching all of them"""
+        result = None
+        for f in filters:
+            positions = self._positions_for(f)
+            result = positions if result is None else np.intersect1d(result, positions, assume_unique=True)
+            if len(result) == 0:
+                break
+        return result if result is not None else np.arange(len(self.df))
+
+    def _positions_for(self, f: Dict[str, Any]) -> np.ndarray:
+        column, op, value = f["column"], f["op"], f["value"]
+        if op in ("==", "!=", "in"):
+            index = self.hash_index(column)
+            if index is not None:
+                if op == "==":
+                    return index.lookup(value)
+                if op == "!=":
+                    return index.exclude(value)
+                return np.unique(np.concatenate([index.lookup(v) for v in value]))
+        else:
+            index = self.sorted_index(column)
+            if index is not None:
+                try:
+                    if op in (">", ">="):
+                        return index.range(low=value, low_inclusive=op == ">=")
+                    return index.range(high=value, high_inclusive=op == "<=")
+                except (TypeError, ValueError):
+                    return np.empty(0, dtype=np.intp)
+        # Column not indexed: fall back to a scan
+        return np.flatnonzero(_mask(self.df[column], op, value).to_numpy())
+
+def _is_text(series: pd.Series) -> bool:
+    return not (
+        pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series)
+    )
+
+def _folded_matches(series: pd.Series, value: Any) -> Tuple[np.ndarray, pd.Index, np.ndarray]:
+    """Factorize a text column and fold each distinct value once, not each row"""
+    codes, uniques = pd.factorize(series)
+    target = fold_text(value)
+    matches = np.fromiter((fold_text(str(u)) == target for u in uniques), dtype=bool, count=len(uniques))
+    return codes, uniques, matches
+
+def _mask(series: pd.Series, op: str, value: Any) -> pd.Series:
+    """Boolean mask for a single filter, computed with a full column scan"""
+    if op == "in":
+        mask = pd.Series(False, index=series.index)
+        for v in value:
+            mask |= _mask(series, "==", v)
+        return mask
+    if op == "!=":
+        # Like SQL, missing values match neither == nor !=
+        return ~_mask(series, "==", value) & series.notna()
+    if op == "==":
+        if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+            try:
+                return series == value
+            except (TypeError, ValueError):
+                return pd.Series(False, index=series.index)
+        codes, _, matches = _folded_matches(series, value)
+        # Missing values (code -1) pick the trailing False
+        return pd.Series(np.append(matches, False)[codes], index=series.index)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        value = pd.Timestamp(str(value))
+    comparisons = {">": series.gt, ">=": series.ge, "<": series.lt, "<=": series.le}
+    try:
+        return comparisons[op](value).fillna(False)
+    except TypeError:
+        return pd.Series(False, index=series.index)
+
+def _as_reported(stored: Any, value: Any) -> Any:
+    """Text is reported as spelled in the column; other values as they were parsed"""
+    if stored is None:
+        return None
+    return stored if isinstance(stored, str) else value
+
+def _scan_stored_value(series: pd.Series, value: Any) -> Any:
+    if _is_text(series):
+        _, uniques, matches = _folded_matches(series, value)
+        hits = np.flatnonzero(matches)
+        return _as_reported(uniques[hits[0]], value) if len(hits) else None
+    matches = series[_mask(series, "==", value)]
+    return _as_reported(matches.iloc[0], value) if len(matches) else None
+
+class IndexManager:
+    """Owns the per-dataset indexes used to answer filtered questions"""
+
+    def __init__(self):
+        self.enabled = os.getenv("ENABLE_INDEXES", "true").lower() == "true"
+        self.max_distinct_ratio = float(os.getenv("INDEX_MAX_DISTINCT_RATIO", "0.1"))
+        self._indexes: Dict[str, DatasetIndex] = {}
+        self._columns: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, file_id: str, columns: Optional[List[str]]) -> None:
+        """Pin the columns to index for a dataset instead of auto-detecting them"""
+        with self._lock:
+            if columns:
+                self._columns[file_id] = columns
+            else:
+                self._columns.pop(file_id, None)
+            self._indexes.pop(file_id, None)
+
+    def get(self, file_id: str, df: pd.DataFrame) -> DatasetIndex:
+        """Return the index for a dataset, rebuilding it if the frame was replaced"""
+        with self._lock:
+            index = self._indexes.get(file_id)
+            if index is None or index.df is not df:
+                index = DatasetIndex(df, self._columns.get(file_id), self.max_distinct_ratio)
+                self._indexes[file_id] = index
+            return index
+
+    def release(self, file_id: str) -> None:
+        """Free a dataset's built indexes but keep its column configuration"""
+        with self._lock:
+            self._indexes.pop(file_id, None)
+
+    def drop(self, file_id: str) -> None:
+        """Drop every index held for a dataset"""
+        with self._lock:
+            self._indexes.pop(file_id, None)
+            self._columns.pop(file_id, None)
+
+    def nbytes(self) -> int:
+        """Memory held by every built index"""
+        with self._lock:
+            indexes = list(self._indexes.values())
+        return sum(index.nbytes for index in indexes)
+
+    def stored_value(self, file_id: str, df: pd.DataFrame, column: str, value: Any) -> Any:
+        if self.enabled:
+            return self.get(file_id, df).stored_value(column, value)
+        return _scan_stored_value(df[column], value)
+
+    def filter_frame(self, file_id: str, df: pd.DataFrame, filters: List[Dict[str, Any]]) -> pd.DataFrame:
+        """Return the rows of a dataset matching all filters"""
+        if not filters:
+            return df
+        if self.enabled:
+            return df.iloc[self.get(file_id, df).filter_positions(filters)]
+        mask = pd.Series(True, index=df.index)
+        for f in filters:
+            mask &= _mask(df[f["column"]], f["op"], f["value"])
+        return df[mask]
+
+# Global instance
+index_manager = IndexManager()
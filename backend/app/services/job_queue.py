@@ -0,0 +1,179 @@
+import os
+import uuid
+import asyncio
+import itertools
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from ..models.job import JobInfo
+
+# Priority classes; lower values are dispatched first
+PRIORITIES = {"interactive": 0, "bulk": 1}
+
+async def run_in_thread(func: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a blocking function in a worker thread, deferring cancellation.
+
+    Threads cannot be interrupted, so a cancelled caller first waits for the
+    thread to return; only then does the cancellation propagate. Whatever the
+    caller holds (a memory reservation, a job slot) stays held while the work
+    is still running, and a cancelled job stops at its next stage boundary.
+    """
+    future = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        while not future.done():
+            try:
+                await asyncio.wait([future])
+            except asyncio.CancelledError:
+                continue
+        if not future.cancelled():
+            future.exception()  # Retrieved so it is not logged as unhandled
+        raise
+
+class Job:
+    """A unit of background work with status, progress and result"""
+
+    def __init__(self, kind: str, client_id: str, priority: str,
+                 work: Callable[["Job"], Awaitable[Any]], sequence: int):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.client_id = client_id
+        self.priority = priority
+        self.status = "queued"  # queued, running, succeeded, failed, cancelled
+        self.progress = 0.0
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.sort_key = (PRIORITIES[priority], sequence)
+        self._work = work
+        self._task: Optional[asyncio.Task] = None
+
+    def report(self, fraction: float) -> None:
+        """Record progress as a fraction between 0 and 1"""
+        self.progress = round(min(max(fraction, 0.0), 1.0), 4)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def info(self) -> JobInfo:
+        return JobInfo(
+            id=self.id,
+            kind=self.kind,
+            priority=self.priority,
+            status=self.status,
+            progress=self.progress,
+            error=self.error,
+            created_at=self.created_at.isoformat(),
+            started_at=self.started_at.isoformat() if self.started_at else None,
+            finished_at=self.finished_at.isoformat() if self.finished_at else None
+        )
+
+class JobScheduler:
+    """
+    asyncio scheduler for uploads and analyses that outlive an HTTP request.
+
+    Jobs are dispatched by priority class, then submission order. Bulk jobs
+    may only occupy ``bulk_slots`` of the ``workers`` slots, so interactive
+    jobs always find capacity, and each client may run at most
+    ``client_concurrency`` jobs at once.
+    """
+
+    def __init__(self):
+        self.workers = int(os.getenv("JOB_WORKERS", "4"))
+        self.bulk_slots = min(int(os.getenv("JOB_BULK_SLOTS", "2")), self.workers)
+        self.client_concurrency = int(os.getenv("JOB_CLIENT_CONCURRENCY", "2"))
+        self.retention = timedelta(seconds=int(os.getenv("JOB_RETENTION_SECONDS", "3600")))
+        self._jobs: Dict[str, Job] = {}
+        self._pending: List[Job] = []
+        self._running: Dict[str, Job] = {}
+        self._sequence = itertools.count()
+
+    def submit(self, kind: str, client_id: str, priority: str,
+               work: Callable[[Job], Awaitable[Any]]) -> Job:
+        """Queue a coroutine function taking the job; must be called from the event loop"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        self._prune()
+        job = Job(kind, client_id, priority, work, next(self._sequence))
+        self._jobs[job.id] = job
+        self._pending.append(job)
+        self._dispatch()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued or running job; finished jobs are left as they are"""
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        if job in self._pending:
+            self._pending.remove(job)
+            self._finish(job, "cancelled")
+        elif job._task is not None:
+            job._task.cancel()
+        return job
+
+    def _runnable(self, job: Job) -> bool:
+        running = self._running.values()
+        if sum(1 for j in running if j.client_id == job.client_id) >= self.client_concurrency:
+            return False
+        if job.priority == "bulk" and sum(1 for j in running if j.priority == "bulk") >= self.bulk_slots:
+            return False
+        return True
+
+    def _dispatch(self) -> None:
+        """Start the highest-priority runnable jobs while worker slots are free"""
+        self._pending.sort(key=lambda j: j.sort_key)
+        for job in list(self._pending):
+            if len(self._running) >= self.workers:
+                break
+            if not self._runnable(job):
+                continue
+            self._pending.remove(job)
+            self._running[job.id] = job
+            job.status = "running"
+            job.started_at = datetime.now()
+            job._task = asyncio.get_running_loop().create_task(self._run(job))
+
+    async def _run(self, job: Job) -> None:
+        try:
+            job.result = await job._work(job)
+            job.report(1.0)
+            self._finish(job, "succeeded")
+        except asyncio.CancelledError:
+            self._finish(job, "cancelled")
+        except Exception as e:
+            job.error = getattr(e, "detail", None) or str(e)
+            self._finish(job, "failed")
+        finally:
+            self._running.pop(job.id, None)
+            self._dispatch()
+
+    def _finish(self, job: Job, status: str) -> None:
+        job.status = status
+        job.finished_at = datetime.now()
+        job._work = None
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than the retention window"""
+        cutoff = datetime.now() - self.retention
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "running": len(self._running),
+            "workers": self.workers,
+            "bulk_slots": self.bulk_slots,
+            "client_concurrency": self.client_concurrency
+        }
+
+# Global instance
+job_scheduler = JobScheduler()
@@ -1,9 +1,26 @@
 import os
 import json
+import time
+import asyncio
+import threading
 import requests
-from typing import Dict, Any, List
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, List
 from abc import ABC, abstractmethod
 
+class ProviderRateLimited(Exception):
+    """Raised when a provider answers 429 Too Many Requests"""
+    
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class RateLimitExceeded(Exception):
+    """Raised when a call cannot get a provider slot within the queue limits"""
+    pass
+
 class LLMProvider(ABC):
     """Abstract base class for LLM providers"""
     
@@ -11,6 +28,15 @@ class LLMProvider(ABC):
     def call(self, prompt: str, max_tokens: int, temperature: float) -> str:
         """Make a call to the LLM provider"""
         pass
+    
+    def _check_rate_limit(self, response: requests.Response) -> None:
+        """Surface 429 responses so the client can back off"""
+        if response.status_code == 429:
+            try:
+                retry_after = float(response.headers.get("Retry-After", "1"))
+            except ValueError:
+                retry_after = 1.0
+            raise ProviderRateLimited(f"{type(self).__name__} rate limited", retry_after)
 
 class OpenAIProvider(LLMProvider):
     """OpenAI API provider implementation"""
@@ -40,11 +66,14 @@ class OpenAIProvider(LLMProvider):
                 json=data,
                 timeout=30
             )
+            self._check_rate_limit(response)
             response.raise_for_status()
             
             result = response.json()
             return result["choices"][0]["message"]["content"]
             
+        except ProviderRateLimited:
+            raise
         except Exception as e:
             raise Exception(f"OpenAI API error: {e}")
 
@@ -77,11 +106,14 @@ class AnthropicProvider(LLMProvider):
                 json=data,
                 timeout=30
             )
+            self._check_rate_limit(response)
             response.raise_for_status()
             
             result = response.json()
             return result["content"][0]["text"]
             
+        except ProviderRateLimited:
+            raise
         except Exception as e:
             raise Exception(f"Anthropic API error: {e}")
 
@@ -109,25 +141,176 @@ class OllamaProvider(LLMProvider):
                 json=data,
                 timeout=60  # Longer timeout for local models
             )
+            self._check_rate_limit(response)
             response.raise_for_status()
             
             result = response.json()
             return result["response"]
             
+        except ProviderRateLimited:
+            raise
         except Exception as e:
             raise Exception(f"Ollama API error: {e}")
 
+class TokenBucket:
+    """Token bucket refilled continuously at ``per_minute`` tokens per minute"""
+    
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+    
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def reserve(self, amount: float) -> float:
+        """Take ``amount`` tokens, going into debt if needed; returns seconds until they are covered"""
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+        return max(0.0, -self.tokens / self.rate)
+    
+    def refund(self, amount: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + min(amount, self.capacity))
+    
+    def drain(self, seconds: float) -> None:
+        """Empty the bucket so no tokens are available for ``seconds``"""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+class ProviderLimiter:
+    """
+    Client-side limits for one provider: request and token buckets plus a
+    bounded number of concurrent calls, granted in FIFO order.
+    """
+    
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float,
+                 max_concurrency: int, queue_timeout: float, max_queue: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self._queue: deque = deque()
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self.completed = 0
+        self.rejections = 0
+        self.provider_429s = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+    
+    @contextmanager
+    def acquire(self, tokens: int):
+        """Wait for a concurrency slot and bucket capacity, in arrival order"""
+        start = time.monotonic()
+        deadline = start + self.queue_timeout
+        ticket = object()
+        
+        with self._condition:
+            if len(self._queue) >= self.max_queue:
+                self.rejections += 1
+                raise RateLimitExceeded("LLM request queue is full")
+            self._queue.append(ticket)
+            while self._queue[0] is not ticket or self._in_flight >= self.max_concurrency:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._queue.remove(ticket)
+                    self.rejections += 1
+                    self._condition.notify_all()
+                    raise RateLimitExceeded("Timed out waiting for an LLM slot")
+                self._condition.wait(remaining)
+            self._queue.popleft()
+            self._in_flight += 1
+            
+            # Reservations are made in FIFO order, so later callers wait behind this one
+            delay = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+            if time.monotonic() + delay > deadline:
+                self.requests.refund(1)
+                self.tokens.refund(tokens)
+                self._in_flight -= 1
+                self.rejections += 1
+                self._condition.notify_all()
+                raise RateLimitExceeded("LLM rate limit would be exceeded")
+            self._condition.notify_all()
+        
+        if delay:
+            time.sleep(delay)
+        waited = time.monotonic() - start
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self.completed += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+                self._condition.notify_all()
+    
+    def penalize(self, retry_after: float) -> None:
+        """Back off after the provider itself rate limited us"""
+        with self._condition:
+            self.provider_429s += 1
+            self.requests.drain(retry_after)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "queued": len(self._queue),
+                "in_flight": self._in_flight,
+                "max_concurrency": self.max_concurrency,
+                "completed": self.completed,
+                "rejections": self.rejections,
+                "provider_429s": self.provider_429s,
+                "avg_wait_seconds": round(self.total_wait / self.completed, 4) if self.completed else 0.0,
+                "max_wait_seconds": round(self.max_wait, 4)
+            }
+
+# Default per-provider limits; override with e.g. OPENAI_REQUESTS_PER_MINUTE
+PROVIDER_LIMITS = {
+    "openai": {"requests_per_minute": 500, "tokens_per_minute": 200000, "max_concurrency": 8},
+    "anthropic": {"requests_per_minute": 50, "tokens_per_minute": 50000, "max_concurrency": 4},
+    "ollama": {"requests_per_minute": 600, "tokens_per_minute": 1000000, "max_concurrency": 1},
+}
+
 class LLMClient:
     """Client for making calls to LLM providers"""
     
     def __init__(self):
+        self.provider_name = os.getenv("LLM_PROVIDER", "ollama")
         self.provider = self._create_provider()
         self.max_tokens = int(os.getenv("MAX_TOKENS", "1000"))
         self.temperature = float(os.getenv("TEMPERATURE", "0.7"))
+        self.limiter = self._create_limiter()
+        # LLM calls can wait in the limiter's queue for up to its timeout, so
+        # they get their own threads (one per slot or queue place) rather than
+        # tying up the default pool that parsing and analysis run on
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.limiter.max_concurrency + self.limiter.max_queue,
+            thread_name_prefix="llm"
+        )
+    
+    def _create_limiter(self) -> ProviderLimiter:
+        """Create the rate limiter for the configured provider"""
+        defaults = PROVIDER_LIMITS.get(self.provider_name, PROVIDER_LIMITS["openai"])
+        prefix = self.provider_name.upper()
+        
+        def setting(name: str) -> float:
+            return float(os.getenv(f"{prefix}_{name.upper()}", os.getenv(f"LLM_{name.upper()}", defaults[name])))
+        
+        return ProviderLimiter(
+            requests_per_minute=setting("requests_per_minute"),
+            tokens_per_minute=setting("tokens_per_minute"),
+            max_concurrency=int(setting("max_concurrency")),
+            queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "30")),
+            max_queue=int(os.getenv("LLM_MAX_QUEUE", "32"))
+        )
     
     def _create_provider(self) -> LLMProvider:
         """Create the appropriate LLM provider based on configuration"""
-        provider_name = os.getenv("LLM_PROVIDER", "ollama")
+        provider_name = self.provider_name
         
         if provider_name == "openai":
             api_key = os.getenv("OPENAI_API_KEY")
@@ -152,10 +335,24 @@ class LLMClient:
     
     def generate_text(self, prompt: str) -> str:
         """Generate text using the configured LLM provider"""
+        # Rough token estimate: ~4 characters per prompt token plus the completion budget
+        tokens = len(prompt) // 4 + self.max_tokens
         try:
-            return self.provider.call(prompt, self.max_tokens, self.temperature)
+            with self.limiter.acquire(tokens):
+                return self.provider.call(prompt, self.max_tokens, self.temperature)
+        except ProviderRateLimited as e:
+            self.limiter.penalize(e.retry_after)
+            raise Exception(f"LLM generation failed: {e}")
         except Exception as e:
             raise Exception(f"LLM generation failed: {e}")
+    
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a blocking function that calls the LLM on the LLM threads"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Queue wait and rejection counters for the configured provider"""
+        return {"provider": self.provider_name, **self.limiter.stats()}
 
 # Global instance
 llm_client = LLMClient() 
\ No newline at end of file
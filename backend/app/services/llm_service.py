@@ -1,8 +1,10 @@
 import pandas as pd
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import json
 import re
 from .question_generator import question_generator
+from .date_detection import iso_records
+from .lookup_index import LookupIndex
 
 class LLMService:
     """Service responsible for data analysis and coordinating question generation"""
@@ -41,7 +43,7 @@ class LLMService:
             "numeric_columns": [],
             "categorical_columns": [],
             "date_columns": [],
-            "sample_data": df.head(3).to_dict('records'),
+            "sample_data": iso_records(df.head(3)),
             "column_descriptions": {}
         }
 
@@ -59,20 +61,22 @@ class LLMService:
 
         return analysis
 
-    def generate_questions_for_category(self, category: str, data_analysis: Dict[str, Any]) -> List[Dict[str, str]]:
+    def generate_questions_for_category(self, category: str, data_analysis: Dict[str, Any],
+                                        lookup: Optional[LookupIndex] = None) -> List[Dict[str, str]]:
         """Generate questions for a specific category using the question generator"""
         
         # Get sample data for question generation
         sample_data = data_analysis.get("sample_data", [])
         
         # Delegate question generation to the dedicated service
-        return question_generator.generate_questions(category, data_analysis, sample_data)
+        return question_generator.generate_questions(category, data_analysis, sample_data, lookup)
 
     def get_categories(self) -> Dict[str, Any]:
         """Get all available categories"""
         return self.categories
 
-    def get_questions_for_category(self, category: str, df: pd.DataFrame) -> Dict[str, Any]:
+    def get_questions_for_category(self, category: str, df: pd.DataFrame,
+                                   lookup: Optional[LookupIndex] = None) -> Dict[str, Any]:
         """Get questions for a specific category"""
         if category not in self.categories:
             raise ValueError(f"Unknown category: {category}")
@@ -81,7 +85,7 @@ class LLMService:
         analysis = self.analyze_data_structure(df)
         
         # Generate questions using the question generator
-        questions = self.generate_questions_for_category(category, analysis)
+        questions = self.generate_questions_for_category(category, analysis, lookup)
         
         return {
             "category": self.categories[category],
@@ -0,0 +1,259 @@
+import os
+import re
+import sys
+import threading
+import pandas as pd
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+from .query_parser import fold_text, column_aliases, NUMBER_PATTERN
+
+# Question words that never refer to a column or value on their own;
+# they still match when they are a column's full name
+STOPWORDS = {
+    "a", "an", "the", "of", "by", "for", "in", "on", "to", "and", "or", "is", "are", "was", "were",
+    "what", "which", "who", "how", "show", "me", "give", "list", "all", "any", "per", "each", "with",
+    "where", "from", "than", "over", "under", "between", "my", "our", "this", "that", "it", "do",
+    "does", "many", "much", "total", "count", "sum", "average", "mean", "median", "percentile",
+    "top", "most", "least", "common", "frequent", "trend", "distribution", "histogram", "scatter",
+    "unique", "distinct", "number", "value", "values", "data", "dataset", "row", "rows", "column",
+    "columns", "time", "day", "week", "month", "year", "daily", "weekly", "monthly", "line", "chart",
+    "yes", "no", "none", "other", "true", "false",
+}
+
+def _stem(token: str) -> str:
+    """Crude plural folding so "regions" finds "region" and "categories" "category" """
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+def _trigrams(token: str) -> Set[str]:
+    padded = f"#{token}#"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _name_tokens(column: str) -> List[str]:
+    """Words of a column name, splitting snake_case, kebab-case and camelCase"""
+    spaced = re.sub(r"(?<=[a-z0-9])(?=[A-Z])", " ", str(column))
+    return fold_text(re.sub(r"[_\-]+", " ", spaced)).split()
+
+def _deep_sizeof(obj: Any) -> int:
+    """Approximate memory of nested dicts, lists, tuples and sets of small values"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k) + _deep_sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(_deep_sizeof(item) for item in obj)
+    return size
+
+class QuestionTerms:
+    """Columns and values a question refers to, as resolved by a LookupIndex"""
+
+    def __init__(self):
+        self.columns: List[str] = []
+        # Text after each mention of a column, for filter parsing
+        self.tails: Dict[str, List[str]] = {}
+        # (column, value) pairs for values mentioned without their column
+        self.values: List[Tuple[str, Any]] = []
+
+class LookupIndex:
+    """
+    Inverted index over a dataset's column names and low-cardinality values.
+
+    Column names are indexed as whole phrases keyed by their first word, as
+    single (plural-folded) words, and as trigrams of those words for fuzzy
+    matching. Distinct values of text columns with at most
+    ``max_cardinality`` values are indexed as phrases keyed by their first
+    word. Resolving a question costs a few dictionary lookups per question
+    word, independent of how many columns the dataset has.
+    """
+
+    def __init__(self, df: pd.DataFrame, max_cardinality: int = 1000, fuzzy_threshold: float = 0.5):
+        self.fuzzy_threshold = fuzzy_threshold
+        self._column_phrases: Dict[str, List[Tuple[Tuple[str, ...], str]]] = defaultdict(list)
+        self._word_columns: Dict[str, Dict[str, None]] = defaultdict(dict)
+        self._word_trigrams: Dict[str, Set[str]] = defaultdict(set)
+        self._value_phrases: Dict[str, List[Tuple[Tuple[str, ...], str, Any]]] = defaultdict(list)
+        self.column_values: Dict[str, List[Any]] = {}
+        # Folded value -> first spelling seen, per indexed column
+        self._value_sets: Dict[str, Dict[str, str]] = {}
+
+        for column, dtype in df.dtypes.items():
+            name_words = _name_tokens(column)
+            aliases = column_aliases(column) + [" ".join(name_words)]
+            for alias in dict.fromkeys(a for a in aliases if a):
+                words = tuple(alias.split())
+                self._column_phrases[words[0]].append((words, column))
+            for word in dict.fromkeys(_stem(w) for w in name_words):
+                if word in STOPWORDS or len(word) < 3:
+                    continue
+                # Dicts keep first-seen column order with O(1) membership
+                self._word_columns[word][column] = None
+                for gram in _trigrams(word):
+                    self._word_trigrams[gram].add(word)
+            if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_object_dtype(dtype) \
+                    or pd.api.types.is_string_dtype(dtype):
+                self._index_values(column, df[column], max_cardinality)
+
+        # Longest phrases first so "total revenue" wins over "total"
+        for postings in (self._column_phrases, self._value_phrases):
+            for phrases in postings.values():
+                phrases.sort(key=lambda p: -len(p[0]))
+
+        # Measured once; strings shared between structures are counted per use
+        self.nbytes = sum(_deep_sizeof(structure) for structure in (
+            self._column_phrases, self._word_columns, self._word_trigrams,
+            self._value_phrases, self.column_values, self._value_sets
+        ))
+
+    def _index_values(self, column: str, series: pd.Series, max_cardinality: int) -> None:
+        uniques = pd.unique(series.dropna())
+        if len(uniques) > max_cardinality or not all(isinstance(v, str) for v in uniques):
+            return
+        self.column_values[column] = list(uniques)
+        spellings: Dict[str, str] = {}
+        for value in uniques:
+            spellings.setdefault(fold_text(value), value)
+        self._value_sets[column] = spellings
+        for value in uniques:
+            folded = fold_text(value)
+            # Numbers and question words are too ambiguous to imply a filter
+            if not folded or folded in STOPWORDS or re.fullmatch(NUMBER_PATTERN, folded):
+                continue
+            words = tuple(folded.split())
+            self._value_phrases[words[0]].append((words, column, value))
+
+    def covers(self, column: str) -> bool:
+        return column in self._value_sets
+
+    def stored_value(self, column: str, value: Any) -> Optional[str]:
+        """A covered column's own spelling of ``value``, or None if it does not hold it"""
+        return self._value_sets.get(column, {}).get(fold_text(value))
+
+    def _fuzzy_words(self, word: str) -> List[str]:
+        """Indexed column-name words whose trigram Jaccard similarity clears the threshold"""
+        grams = _trigrams(word)
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for candidate in self._word_trigrams.get(gram, ()):
+                shared[candidate] += 1
+        scored = [
+            (n / (len(grams) + len(_trigrams(candidate)) - n), candidate)
+            for candidate, n in shared.items()
+        ]
+        scored = [(score, candidate) for score, candidate in scored if score >= self.fuzzy_threshold]
+        if not scored:
+            return []
+        best = max(score for score, _ in scored)
+        return sorted(candidate for score, candidate in scored if score == best)
+
+    def resolve(self, question: str) -> QuestionTerms:
+        """Map the words of a question to the columns and values they refer to"""
+        words = fold_text(question).split()
+        terms = QuestionTerms()
+        taken = [False] * len(words)
+        first_seen: Dict[str, int] = {}
+
+        def mention(column: str, start: int, end: int) -> None:
+            for i in range(start, end):
+                taken[i] = True
+            first_seen[column] = min(first_seen.get(column, start), start)
+            terms.tails.setdefault(column, []).append(" ".join(words[end:]))
+
+        # Whole column names, longest match at each position
+        i = 0
+        while i < len(words):
+            match = next(
+                ((phrase, column) for phrase, column in self._column_phrases.get(words[i], ())
+                 if tuple(words[i:i + len(phrase)]) == phrase),
+                None
+            )
+            if match:
+                mention(match[1], i, i + len(match[0]))
+                i += len(match[0])
+            else:
+                i += 1
+
+        # Values of low-cardinality columns, when they belong to exactly one column
+        i = 0
+        while i < len(words):
+            if taken[i]:
+                i += 1
+                continue
+            matches = [
+                (phrase, column, value) for phrase, column, value in self._value_phrases.get(words[i], ())
+                if tuple(words[i:i + len(phrase)]) == phrase and not any(taken[i:i + len(phrase)])
+            ]
+            if matches:
+                length = len(matches[0][0])
+                longest = [m for m in matches if len(m[0]) == length]
+                if len({column for _, column, _ in longest}) == 1:
+                    terms.values.append((longest[0][1], longest[0][2]))
+                for j in range(i, i + length):
+                    taken[j] = True
+                i += length
+            else:
+                i += 1
+
+        # Single words of column names ("revenue" for total_revenue), then fuzzy matches
+        for i, word in enumerate(words):
+            stem = _stem(word)
+            if taken[i] or stem in STOPWORDS or len(stem) < 3 or not stem.isalpha():
+                continue
+            if stem in self._word_columns:
+                columns = list(self._word_columns[stem])
+            elif len(stem) >= 4:
+                columns = [c for w in self._fuzzy_words(stem) for c in self._word_columns[w]]
+            else:
+                columns = []
+            for column in list(dict.fromkeys(columns))[:3]:
+                mention(column, i, i + 1)
+
+        # Columns in order of appearance, like query_parser.find_columns
+        terms.columns = sorted(first_seen, key=first_seen.get)
+        terms.tails = {column: terms.tails[column] for column in terms.columns}
+        return terms
+
+    def find_columns(self, question: str) -> List[str]:
+        return self.resolve(question).columns
+
+    def describe(self, max_columns: int = 10, max_values: int = 8) -> Dict[str, List[Any]]:
+        """Example values of the indexed categorical columns, for prompts"""
+        return {
+            column: values[:max_values]
+            for column, values in list(self.column_values.items())[:max_columns]
+        }
+
+class LookupStore:
+    """Holds a lookup index per dataset, built at upload"""
+
+    def __init__(self):
+        self.enabled = os.getenv("ENABLE_LOOKUP_INDEX", "true").lower() == "true"
+        self.max_cardinality = int(os.getenv("LOOKUP_MAX_CARDINALITY", "1000"))
+        self.fuzzy_threshold = float(os.getenv("LOOKUP_FUZZY_THRESHOLD", "0.5"))
+        self._indexes: Dict[str, LookupIndex] = {}
+        self._lock = threading.Lock()
+
+    def build(self, file_id: str, df: pd.DataFrame) -> Optional[LookupIndex]:
+        if not self.enabled:
+            return None
+        index = LookupIndex(df, self.max_cardinality, self.fuzzy_threshold)
+        with self._lock:
+            self._indexes[file_id] = index
+        return index
+
+    def get(self, file_id: str) -> Optional[LookupIndex]:
+        with self._lock:
+            return self._indexes.get(file_id)
+
+    def drop(self, file_id: str) -> None:
+        with self._lock:
+            self._indexes.pop(file_id, None)
+
+    def nbytes(self) -> int:
+        """Memory held by every dataset's lookup index"""
+        with self._lock:
+            return sum(index.nbytes for index in self._indexes.values())
+
+# Global instance
+lookup_store = LookupStore()
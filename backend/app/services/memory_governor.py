@@ -0,0 +1,291 @@
+import os
+import asyncio
+import tempfile
+import threading
+import pandas as pd
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+class AdmissionRejected(Exception):
+    """Raised when an upload cannot be admitted within the memory budget"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class Reservation:
+    """Memory reserved for one in-flight upload; grows when the upload turns out larger"""
+
+    def __init__(self, governor: "MemoryGovernor", nbytes: int):
+        self._governor = governor
+        self.nbytes = nbytes
+
+    async def grow(self, nbytes: int) -> None:
+        """Raise the reservation to ``nbytes``; raises AdmissionRejected if that no longer fits"""
+        extra = nbytes - self.nbytes
+        if extra <= 0:
+            return
+        governor = self._governor
+        async with governor._condition:
+            # Growing never waits: two uploads waiting on each other's memory would deadlock
+            if not governor._fits(extra):
+                governor.rejections += 1
+                raise AdmissionRejected("Upload is larger than the memory available for it", governor.retry_after)
+            governor.reserved_bytes += extra
+            self.nbytes = nbytes
+        await governor.make_room()
+
+class GovernedStore(MutableMapping):
+    """
+    Dataset mapping that keeps resident frames within the governor's budget.
+
+    Least-recently-used frames are spilled to disk (or dropped when spilling
+    is disabled) and transparently reloaded on the next access. Storing and
+    reading frames can measure, pickle or unpickle them, so async callers
+    should do both in a worker thread. The lock only guards the bookkeeping;
+    pickling and unpickling happen outside it so other threads are not held
+    up behind disk I/O.
+    """
+
+    def __init__(self, governor: "MemoryGovernor"):
+        self._governor = governor
+        self._resident: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+        # Frames being written to disk; still readable until the write finishes
+        self._spilling: Dict[str, pd.DataFrame] = {}
+        self._spilled: Dict[str, str] = {}
+        self.sizes: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    def __getitem__(self, file_id: str) -> pd.DataFrame:
+        while True:
+            with self._lock:
+                if file_id in self._resident:
+                    self._resident.move_to_end(file_id)
+                    return self._resident[file_id]
+                if file_id in self._spilling:
+                    # Reclaimed before its spill finished; the spill is abandoned
+                    df = self._resident[file_id] = self._spilling.pop(file_id)
+                    return df
+                if file_id not in self._spilled:
+                    raise KeyError(file_id)
+                path = self._spilled[file_id]
+
+            try:
+                df = pd.read_pickle(path)
+            except FileNotFoundError:
+                continue  # Reloaded or deleted by another thread; look again
+            with self._lock:
+                if self._spilled.get(file_id) != path:
+                    continue  # Reloaded, replaced or deleted by another thread meanwhile
+                del self._spilled[file_id]
+                os.remove(path)
+                self._resident[file_id] = df
+                self._governor.reloads += 1
+            self._governor.enforce_budget(keep=file_id)
+            return df
+
+    def __setitem__(self, file_id: str, df: pd.DataFrame) -> None:
+        size = int(df.memory_usage(deep=True).sum())
+        # Eviction always keeps the frame being stored, so one that cannot fit
+        # on its own would stay resident over the budget
+        if size > self._governor.budget_bytes:
+            self._governor.rejections += 1
+            raise AdmissionRejected("Dataset is larger than the server's memory budget", self._governor.retry_after)
+        with self._lock:
+            self._discard(file_id)
+            self._resident[file_id] = df
+            self.sizes[file_id] = size
+        self._governor.enforce_budget(keep=file_id)
+
+    def __delitem__(self, file_id: str) -> None:
+        with self._lock:
+            if file_id not in self:
+                raise KeyError(file_id)
+            self._discard(file_id)
+
+    def pop(self, file_id: str, default: Any = None) -> Any:
+        """Remove a dataset without reloading it from disk first"""
+        with self._lock:
+            if file_id not in self:
+                return default
+            df = self._resident.get(file_id, self._spilling.get(file_id))
+            self._discard(file_id)
+            return df
+
+    def _discard(self, file_id: str) -> None:
+        self._resident.pop(file_id, None)
+        self._spilling.pop(file_id, None)
+        self.sizes.pop(file_id, None)
+        path = self._spilled.pop(file_id, None)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def __contains__(self, file_id: object) -> bool:
+        with self._lock:
+            return file_id in self._resident or file_id in self._spilling or file_id in self._spilled
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._resident) + list(self._spilling) + list(self._spilled))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._resident) + len(self._spilling) + len(self._spilled)
+
+    @property
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(self.sizes[file_id] for file_id in self._resident)
+
+    @property
+    def resident_count(self) -> int:
+        return len(self._resident)
+
+    @property
+    def spilled_count(self) -> int:
+        with self._lock:
+            return len(self._spilling) + len(self._spilled)
+
+    def evict_lru(self, keep: Optional[str] = None) -> Optional[str]:
+        """Spill or drop the least recently used resident dataset other than ``keep``"""
+        spilled = self._governor.spill_enabled
+        with self._lock:
+            victim = next((file_id for file_id in self._resident if file_id != keep), None)
+            if victim is None:
+                return None
+            df = self._resident.pop(victim)
+            if spilled:
+                self._spilling[victim] = df
+            else:
+                self.sizes.pop(victim, None)
+
+        if spilled:
+            fd, path = tempfile.mkstemp(prefix=f"{victim}-", suffix=".pkl", dir=self._governor.spill_dir)
+            os.close(fd)
+            df.to_pickle(path)
+            with self._lock:
+                if self._spilling.get(victim) is df:
+                    del self._spilling[victim]
+                    self._spilled[victim] = path
+                else:
+                    # Read back or removed while it was being written
+                    os.remove(path)
+        if self._governor.on_evict:
+            self._governor.on_evict(victim, spilled)
+        return victim
+
+class MemoryGovernor:
+    """Keeps dataset memory within a configured budget and admits uploads against it"""
+
+    def __init__(self):
+        self.budget_bytes = int(float(os.getenv("MEMORY_BUDGET_MB", "1024")) * 1024 * 1024)
+        self.spill_enabled = os.getenv("SPILL_TO_DISK", "true").lower() == "true"
+        self.spill_dir = os.getenv("SPILL_DIR", os.path.join(tempfile.gettempdir(), "dataverse_spill"))
+        # Parsed frames are several times larger than the raw upload bytes
+        self.expansion_factor = float(os.getenv("PARSE_EXPANSION_FACTOR", "4"))
+        self.queue_timeout = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+        self.max_queue = int(os.getenv("ADMISSION_MAX_QUEUE", "8"))
+        self.retry_after = int(os.getenv("ADMISSION_RETRY_AFTER", "30"))
+        if self.spill_enabled:
+            os.makedirs(self.spill_dir, exist_ok=True)
+
+        self.datasets = GovernedStore(self)
+        self.on_evict: Optional[Callable[[str, bool], None]] = None
+        # Memory held by structures derived from datasets (indexes, sketches,
+        # rollups, lookup indexes); spilled datasets keep theirs in memory
+        self.derived_bytes: Optional[Callable[[], int]] = None
+        self.reserved_bytes = 0
+        self.queued = 0
+        self.evictions = 0
+        self.reloads = 0
+        self.rejections = 0
+        self._condition: Optional[asyncio.Condition] = None
+
+    def estimate_parsed_bytes(self, upload_bytes: int) -> int:
+        """Estimate memory needed to hold an upload's raw bytes and its parsed frame"""
+        return int(upload_bytes * (1 + self.expansion_factor))
+
+    def _derived_bytes(self) -> int:
+        return self.derived_bytes() if self.derived_bytes else 0
+
+    def _over_budget(self) -> bool:
+        return self.datasets.resident_bytes + self._derived_bytes() + self.reserved_bytes > self.budget_bytes
+
+    def enforce_budget(self, keep: Optional[str] = None) -> None:
+        """Evict least recently used datasets until resident + derived + reserved memory fits"""
+        while self._over_budget():
+            if self.datasets.evict_lru(keep=keep) is None:
+                break
+            self.evictions += 1
+
+    async def make_room(self) -> None:
+        """Enforce the budget from the event loop; spilling runs in a worker thread"""
+        if self._over_budget():
+            await asyncio.to_thread(self.enforce_budget)
+
+    def _fits(self, estimated_bytes: int) -> bool:
+        # Resident datasets can always be evicted; in-flight uploads cannot
+        return self.reserved_bytes + estimated_bytes <= self.budget_bytes
+
+    @asynccontextmanager
+    async def admit(self, estimated_bytes: int):
+        """
+        Reserve memory for an upload while it is parsed.
+
+        Admits immediately when the reservation fits, otherwise queues until
+        other in-flight uploads finish; raises AdmissionRejected when the
+        upload can never fit, the queue is full or the wait times out. Yields
+        the Reservation, which can grow once the real size is known.
+        """
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+
+        if estimated_bytes > self.budget_bytes:
+            self.rejections += 1
+            raise AdmissionRejected("Upload is larger than the server's memory budget", self.retry_after)
+
+        async with self._condition:
+            if not self._fits(estimated_bytes):
+                if self.queued >= self.max_queue:
+                    self.rejections += 1
+                    raise AdmissionRejected("Too many uploads in progress", self.retry_after)
+                self.queued += 1
+                try:
+                    await asyncio.wait_for(
+                        self._condition.wait_for(lambda: self._fits(estimated_bytes)),
+                        timeout=self.queue_timeout
+                    )
+                except asyncio.TimeoutError:
+                    self.rejections += 1
+                    raise AdmissionRejected("Timed out waiting for memory", self.retry_after)
+                finally:
+                    self.queued -= 1
+            self.reserved_bytes += estimated_bytes
+
+        reservation = Reservation(self, estimated_bytes)
+        try:
+            await self.make_room()
+            yield reservation
+        finally:
+            async with self._condition:
+                self.reserved_bytes -= reservation.nbytes
+                self._condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "budget_bytes": self.budget_bytes,
+            "resident_bytes": self.datasets.resident_bytes,
+            "derived_bytes": self._derived_bytes(),
+            "reserved_bytes": self.reserved_bytes,
+            "resident_datasets": self.datasets.resident_count,
+            "spilled_datasets": self.datasets.spilled_count,
+            "queued_uploads": self.queued,
+            "evictions": self.evictions,
+            "reloads": self.reloads,
+            "rejections": self.rejections
+        }
+
+# Global instance
+memory_governor = MemoryGovernor()
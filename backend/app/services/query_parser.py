@@ -0,0 +1,252 @@
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+# Comparison phrases recognised after a column name, longest first so that
+# ">=" wins over ">" and "greater than or equal to" over "greater than"
+RANGE_OPERATORS = [
+    (">=", ">="), ("<=", "<="), (">", ">"), ("<", "<"),
+    ("greater than or equal to", ">="), ("less than or equal to", "<="),
+    ("at least", ">="), ("at most", "<="),
+    ("greater than", ">"), ("more than", ">"), ("above", ">"), ("over", ">"), ("after", ">"),
+    ("less than", "<"), ("below", "<"), ("under", "<"), ("before", "<"),
+]
+
+EQUALITY_OPERATORS = ["==", "=", "equals", "equal to", "is", ":"]
+# Checked before the others so "is not" is not read as "is" and "<>" as "<"
+NEGATION_OPERATORS = ["!=", "<>", "is not", "not equal to", "does not equal", "other than", "not"]
+
+# Words that end a filter value ("customer ACME and region EMEA")
+# Commas between digits are thousands separators, not terminators
+VALUE_TERMINATORS = re.compile(r"\s+(?:and|or|where|with|by)\s+|(?!(?<=\d),(?=\d))[,;?]|\.(?:\s|$)")
+
+# Plain or comma-grouped integers with an optional fraction ("-3", "1.5", "1,000,000")
+NUMBER_PATTERN = r"-?(?:\d{1,3}(?:,\d{3})+(?!\d)|\d+)(?:\.\d+)?"
+DATE_PATTERN = r"\d{4}-\d{2}-\d{2}(?:[ t]\d{2}:\d{2}(?::\d{2})?)?"
+
+# Punctuation is folded to spaces, except comparison operators and the
+# separators inside numbers, dates and times ("1.5", "1,000", "2024-01-31", "-3")
+PUNCTUATION = re.compile(r"(?!(?<=\d)[.,\-/:](?=\d))(?!-(?=\d))(?!!=)[^\w\s<>=]|_(?=\s|$)")
+
+NUMBER_WORDS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13,
+    "fourteen": 14, "fifteen": 15, "sixteen": 16, "seventeen": 17, "eighteen": 18,
+    "nineteen": 19, "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60,
+    "seventy": 70, "eighty": 80, "ninety": 90,
+}
+SCALE_WORDS = {"hundred": 100, "thousand": 1000, "million": 1000000}
+# "second" is left out on purpose: it is far more often a unit of time
+ORDINAL_WORDS = {
+    "first": 1, "third": 3, "fourth": 4, "fifth": 5, "sixth": 6, "seventh": 7, "eighth": 8,
+    "ninth": 9, "tenth": 10, "eleventh": 11, "twelfth": 12, "twentieth": 20, "thirtieth": 30,
+    "fortieth": 40, "fiftieth": 50, "sixtieth": 60, "seventieth": 70, "eightieth": 80,
+    "ninetieth": 90, "hundredth": 100,
+}
+
+def _ordinal(n: int) -> str:
+    suffix = "th" if 10 <= n % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
+
+def _canonicalize_numbers(words: List[str]) -> List[str]:
+    """Replace spelled-out numbers with digits ("twenty five" -> "25", "tenth" -> "10th")"""
+    result, total, partial, in_number = [], 0, 0, False
+
+    def flush():
+        nonlocal total, partial, in_number
+        if in_number:
+            result.append(str(total + partial))
+        total, partial, in_number = 0, 0, False
+
+    for i, word in enumerate(words):
+        if word in NUMBER_WORDS:
+            # "five six" is two numbers, "twenty five" and "hundred five" are one
+            tail = partial % 100
+            if in_number and tail and (tail % 10 or tail < 20 or NUMBER_WORDS[word] >= 10):
+                flush()
+            partial += NUMBER_WORDS[word]
+            in_number = True
+        elif word in SCALE_WORDS and in_number:
+            if word == "hundred":
+                partial *= 100
+            else:
+                total += partial * SCALE_WORDS[word]
+                partial = 0
+        elif (word == "and" and in_number and (total or partial) and partial % 100 == 0
+              and i + 1 < len(words) and words[i + 1] in NUMBER_WORDS):
+            # "one hundred and five", but not "one and two"
+            continue
+        elif word in ORDINAL_WORDS:
+            if in_number and partial % 100 == 0 and ORDINAL_WORDS[word] < 100:
+                partial += ORDINAL_WORDS[word]
+            elif in_number and word == "hundredth":
+                partial *= 100
+            else:
+                flush()
+                partial = ORDINAL_WORDS[word]
+            result.append(_ordinal(total + partial))
+            total, partial, in_number = 0, 0, False
+        else:
+            flush()
+            result.append(word)
+    flush()
+    return result
+
+def fold_text(text: str) -> str:
+    """
+    Fold text for matching: casefold, fold punctuation to spaces, collapse
+    whitespace and canonicalize number words.
+
+    Questions, cache keys and indexed text values all go through this, so two
+    spellings that fold to the same string are treated as the same input.
+    """
+    folded = PUNCTUATION.sub(" ", str(text).casefold())
+    return " ".join(_canonicalize_numbers(folded.split()))
+
+def column_aliases(column: str) -> List[str]:
+    """Return the spellings a question may use to refer to a column"""
+    folded = fold_text(column)
+    aliases = [folded]
+    spaced = fold_text(re.sub(r"[_\-]+", " ", folded))
+    if spaced != folded:
+        aliases.append(spaced)
+    return aliases
+
+def find_columns(question: str, columns: List[str]) -> List[str]:
+    """Find the columns mentioned in a question, in order of appearance"""
+    text = fold_text(question)
+    matches = []
+    for column in columns:
+        for alias in column_aliases(column):
+            match = re.search(rf"(?<!\w){re.escape(alias)}(?!\w)", text)
+            if match:
+                matches.append((match.start(), -len(alias), column))
+                break
+    matches.sort()
+
+    # Drop columns whose mention is contained in a longer one ("amount" in "total amount")
+    found, taken = [], []
+    for start, neg_length, column in matches:
+        end = start - neg_length
+        if any(start >= s and end <= e for s, e in taken):
+            continue
+        taken.append((start, end))
+        found.append(column)
+    return found
+
+def _parse_scalar(raw: str) -> Optional[Any]:
+    """Parse a numeric or ISO date literal from a question"""
+    if re.fullmatch(NUMBER_PATTERN, raw):
+        raw = raw.replace(",", "")
+        return float(raw) if "." in raw else int(raw)
+    if re.fullmatch(DATE_PATTERN, raw):
+        return raw
+    return None
+
+def _candidate_values(tail: str) -> List[str]:
+    """Return possible equality values from the text after an operator, longest first"""
+    value = VALUE_TERMINATORS.split(tail, maxsplit=1)[0].strip().strip("'\"")
+    words = value.split()
+    return [" ".join(words[:n]) for n in range(len(words), 0, -1)]
+
+def parse_filters(
+    question: str,
+    columns: List[str],
+    stored_value: Callable[[str, Any], Any]
+) -> List[Dict[str, Any]]:
+    """
+    Extract equality and range filters from a question.
+
+    Each filter is a dict with "column", "op" (one of ==, !=, >, >=, <, <=,
+    or "in" with a list of values) and "value". Equality values are only accepted when ``stored_value`` finds
+    them in the column (returning its own spelling, or None), which keeps
+    ordinary words in the question from being read as filters.
+    """
+    text = fold_text(question)
+    mentions = {column: _mention_tails(text, column) for column in find_columns(question, columns)}
+    return filters_from_mentions(mentions, stored_value)
+
+def filters_from_mentions(
+    mentions: Dict[str, List[str]],
+    stored_value: Callable[[str, Any], Any]
+) -> List[Dict[str, Any]]:
+    """
+    Parse filters from the folded text following each mention of a column.
+
+    The first mention of a column that yields a filter wins; used directly
+    when the mentions were resolved elsewhere, e.g. by a lookup index.
+    """
+    filters = []
+    for column, tails in mentions.items():
+        for tail in tails:
+            column_filters = _parse_column_filters(column, tail, stored_value)
+            if column_filters:
+                filters.extend(column_filters)
+                break
+    return filters
+
+def _mention_tails(text: str, column: str) -> List[str]:
+    """Return the text following each mention of a column in a question"""
+    tails = []
+    for alias in column_aliases(column):
+        for match in re.finditer(rf"(?<!\w){re.escape(alias)}(?!\w)", text):
+            tails.append(text[match.end():].lstrip())
+    return tails
+
+def _parse_column_filters(
+    column: str,
+    tail: str,
+    stored_value: Callable[[str, Any], Any]
+) -> List[Dict[str, Any]]:
+    """Parse the filters on one column from the text following its mention"""
+    # Negated equality: "stage != closed won", "region is not emea"
+    op = "=="
+    for phrase in NEGATION_OPERATORS:
+        boundary = r"(?!\w)" if phrase[-1].isalpha() else ""
+        if re.match(rf"{re.escape(phrase)}{boundary}", tail):
+            tail, op = tail[len(phrase):].lstrip(), "!="
+            break
+
+    # Range predicates: "amount > 100", "amount between 10 and 20"
+    between = re.match(
+        rf"between\s+({NUMBER_PATTERN}|{DATE_PATTERN})\s+and\s+({NUMBER_PATTERN}|{DATE_PATTERN})",
+        tail
+    )
+    if between and op == "==":
+        low, high = _parse_scalar(between.group(1)), _parse_scalar(between.group(2))
+        return [
+            {"column": column, "op": ">=", "value": low},
+            {"column": column, "op": "<=", "value": high}
+        ]
+
+    for phrase, range_op in RANGE_OPERATORS if op == "==" else ():
+        if tail.startswith(phrase):
+            literal = re.match(
+                rf"\s*({DATE_PATTERN}|{NUMBER_PATTERN})(?!\w)", tail[len(phrase):]
+            )
+            if literal:
+                return [{"column": column, "op": range_op, "value": _parse_scalar(literal.group(1))}]
+            break
+
+    # Equality predicates: "stage = closed won", "customer acme"
+    for phrase in EQUALITY_OPERATORS if op == "==" else ():
+        boundary = r"(?!\w)" if phrase[-1].isalpha() else ""
+        if re.match(rf"{re.escape(phrase)}{boundary}", tail):
+            tail = tail[len(phrase):].lstrip()
+            break
+    for candidate in _candidate_values(tail):
+        value = _parse_scalar(candidate)
+        value = candidate if value is None else value
+        # Report the value as the column spells it, not as the question was folded
+        stored = stored_value(column, value)
+        if stored is not None:
+            return [{"column": column, "op": op, "value": stored}]
+
+    return []
+
+def describe_filters(filters: List[Dict[str, Any]]) -> str:
+    """Render filters as a short human readable clause"""
+    return " and ".join(
+        f"{f['column']} in ({', '.join(str(v) for v in f['value'])})" if f["op"] == "in"
+        else f"{f['column']} {f['op']} {f['value']}"
+        for f in filters
+    )
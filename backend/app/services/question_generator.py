@@ -1,6 +1,7 @@
 import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from .llm_client import llm_client
+from .lookup_index import LookupIndex
 
 class QuestionGenerator:
     """Service responsible for generating questions based on data analysis"""
@@ -25,11 +26,12 @@ class QuestionGenerator:
             }
         }
     
-    def generate_questions(self, category: str, data_analysis: Dict[str, Any], sample_data: List[Dict]) -> List[Dict[str, str]]:
+    def generate_questions(self, category: str, data_analysis: Dict[str, Any], sample_data: List[Dict],
+                           lookup: Optional[LookupIndex] = None) -> List[Dict[str, str]]:
         """Generate questions for a specific category using LLM"""
         
         try:
-            prompt = self._build_prompt(category, data_analysis, sample_data)
+            prompt = self._build_prompt(category, data_analysis, sample_data, lookup)
             llm_response = llm_client.generate_text(prompt)
             return self._parse_llm_response(llm_response)
             
@@ -37,11 +39,16 @@ class QuestionGenerator:
             print(f"Question generation failed: {e}")
             return self._get_fallback_questions(category, data_analysis)
     
-    def _build_prompt(self, category: str, data_analysis: Dict[str, Any], sample_data: List[Dict]) -> str:
+    def _build_prompt(self, category: str, data_analysis: Dict[str, Any], sample_data: List[Dict],
+                      lookup: Optional[LookupIndex] = None) -> str:
         """Build a comprehensive prompt for the LLM"""
         
         cat_info = self.category_info.get(category, self.category_info["learn"])
         
+        # Real values of categorical columns from the dataset's lookup index,
+        # so suggested filters ("... in EMEA") name values that exist
+        known_values = lookup.describe() if lookup else {}
+        
         prompt = f"""
 You are a data analysis assistant. Based on the following dataset information, generate 5-7 relevant questions for the "{category}" category.
 
@@ -56,6 +63,7 @@ Dataset Information:
 - Numeric Columns: {data_analysis.get('numeric_columns', [])}
 - Categorical Columns: {data_analysis.get('categorical_columns', [])}
 - Date Columns: {data_analysis.get('date_columns', [])}
+- Categorical Values: {json.dumps(known_values, default=str)}
 
 Sample Data (first {len(sample_data)} rows):
 {json.dumps(sample_data, indent=2)}
@@ -63,7 +71,7 @@ Sample Data (first {len(sample_data)} rows):
 Instructions:
 1. Generate 5 specific, actionable questions for the {category} category
 2. Questions should be relevant to the actual data structure and content
-3. Make questions specific to the columns and data types present
+3. Make questions specific to the columns and data types present, using the exact column names and categorical values listed
 4. Focus on {cat_info['focus']}
 5. Return ONLY a valid JSON array with "question" and "description" fields
 6. Do not include any markdown formatting or code blocks
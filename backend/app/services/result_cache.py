@@ -0,0 +1,85 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from .query_parser import fold_text
+
+class ResultCache:
+    """Byte-bounded LRU cache of analysis results keyed by dataset version and question"""
+
+    def __init__(self):
+        self.max_bytes = int(float(os.getenv("ANALYSIS_CACHE_MB", "64")) * 1024 * 1024)
+        self._entries: "OrderedDict[Tuple, Tuple[Dict[str, Any], int]]" = OrderedDict()
+        self._bytes = 0
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, file_id: str, version: int, question: str, exact: bool = False) -> Tuple:
+        """Build a cache key; questions that fold to the same text share an entry"""
+        return (file_id, version, fold_text(question), exact)
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Tuple, result: Dict[str, Any]) -> None:
+        """Cache a result; results that are not strict JSON (NaN, infinity) are skipped"""
+        try:
+            size = len(json.dumps(result, default=str, allow_nan=False))
+        except (TypeError, ValueError):
+            return
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            # A new version supersedes every entry for the dataset's older versions
+            file_id, version = key[0], key[1]
+            current = self._versions.get(file_id)
+            if current is not None and version < current:
+                return  # Computed against a version that has since been replaced
+            if current != version:
+                self._drop_where(lambda k: k[0] == file_id)
+                self._versions[file_id] = version
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (result, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, file_id: str) -> None:
+        """Drop every cached result for a dataset"""
+        with self._lock:
+            self._drop_where(lambda k: k[0] == file_id)
+            self._versions.pop(file_id, None)
+
+    def _drop_where(self, predicate) -> None:
+        for key in [k for k in self._entries if predicate(k)]:
+            self._bytes -= self._entries.pop(key)[1]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes
+            }
+
+# Global instance
+result_cache = ResultCache()
@@ -0,0 +1,296 @@
+import os
+import math
+import threading
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional
+
+class HyperLogLog:
+    """HyperLogLog distinct-count sketch over 64-bit pandas hashes"""
+
+    def __init__(self, precision: int = 14):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = np.zeros(self.size, dtype=np.uint8)
+
+    def update(self, series: pd.Series) -> None:
+        values = series.dropna()
+        if values.empty:
+            return
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+        buckets = (hashes >> np.uint64(64 - self.precision)).astype(np.intp)
+        rest = hashes << np.uint64(self.precision)
+
+        # Rank = position of the first set bit in the remaining bits; split into
+        # 32-bit halves so the float conversion used by frexp stays exact
+        _, high_bits = np.frexp((rest >> np.uint64(32)).astype(np.float64))
+        _, low_bits = np.frexp((rest & np.uint64(0xFFFFFFFF)).astype(np.float64))
+        bit_length = np.where(high_bits > 0, high_bits + 32, low_bits)
+        ranks = np.minimum(65 - bit_length, 65 - self.precision).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+
+    def estimate(self) -> float:
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        raw = alpha * self.size ** 2 / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * self.size and zeros:
+            # Small-range correction (linear counting)
+            return self.size * math.log(self.size / zeros)
+        return float(raw)
+
+    @property
+    def relative_error(self) -> float:
+        """Standard error of the estimate, relative to the true count"""
+        return 1.04 / math.sqrt(self.size)
+
+class QuantileSketch:
+    """KLL quantile sketch: levels of compactors with geometrically shrinking capacity"""
+
+    # Probability that a returned quantile is within ``rank_error`` of its rank
+    RANK_ERROR_CONFIDENCE = 0.99
+
+    def __init__(self, k: int = 200, seed: int = 0):
+        self.k = k
+        self.count = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, series: pd.Series) -> None:
+        values = pd.to_numeric(series, errors="coerce").dropna().to_numpy(dtype=np.float64)
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # Keep an odd leftover at this level; promote every other item
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                paired = items[:len(items) - len(keep)]
+                promoted = paired[self._rng.integers(2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** h) for h, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        position = np.searchsorted(cumulative, q * cumulative[-1], side="left")
+        return float(values[order][min(position, len(values) - 1)])
+
+    @property
+    def rank_error(self) -> float:
+        """Normalized rank error of returned quantiles, at RANK_ERROR_CONFIDENCE"""
+        return 2.296 / self.k ** 0.9723
+
+class FrequentItems:
+    """Mergeable Misra-Gries summary of the most frequent values"""
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        # Set from the first non-empty chunk; concatenating onto an empty
+        # Series would warn and could change the index dtype
+        self.counters: Optional[pd.Series] = None
+        self.offset = 0  # Upper bound on how much any count was undercounted
+        self.count = 0
+
+    def update(self, series: pd.Series) -> None:
+        counts = series.value_counts(dropna=True)
+        if counts.empty:
+            return
+        self.count += int(counts.sum())
+        if self.counters is None:
+            merged = counts
+        else:
+            merged = pd.concat([self.counters, counts]).groupby(level=0).sum()
+        if len(merged) > self.capacity:
+            threshold = int(merged.nlargest(self.capacity + 1).iloc[-1])
+            self.offset += threshold
+            merged = merged[merged > threshold] - threshold
+        self.counters = merged if len(merged) else None
+
+    def top(self, n: int) -> List[Dict[str, Any]]:
+        """
+        Return the n most frequent values with estimated counts.
+
+        Each true count lies in [counter, counter + offset]; the estimate is
+        the midpoint, which keeps the worst-case error to half the offset.
+        """
+        if self.counters is None:
+            return []
+        top = self.counters.nlargest(n)
+        return [
+            {
+                "value": _to_builtin(value),
+                "count": int(count) + self.offset // 2,
+                "count_lower_bound": int(count),
+                "count_upper_bound": int(count) + self.offset
+            }
+            for value, count in top.items()
+        ]
+
+def _to_builtin(value: Any) -> Any:
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value.item() if isinstance(value, np.generic) else value
+
+class DatasetSketches:
+    """One-pass summaries of a dataset used to answer questions approximately"""
+
+    def __init__(self, df: pd.DataFrame, sample_size: int, chunk_rows: int = 1_000_000,
+                 confidence_z: float = 1.96):
+        self.row_count = len(df)
+        self.confidence_z = confidence_z
+        self.numeric_columns = [
+            col for col in df.columns
+            if pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])
+        ]
+        self.distinct = {col: HyperLogLog() for col in df.columns}
+        self.quantiles = {col: QuantileSketch() for col in self.numeric_columns}
+        self.frequent = {
+            col: FrequentItems() for col in df.columns if not pd.api.types.is_float_dtype(df[col])
+        }
+
+        for start in range(0, self.row_count, chunk_rows):
+            chunk = df.iloc[start:start + chunk_rows]
+            for col, sketch in self.distinct.items():
+                sketch.update(chunk[col])
+            for col, sketch in self.quantiles.items():
+                sketch.update(chunk[col])
+            for col, sketch in self.frequent.items():
+                sketch.update(chunk[col])
+
+        # Uniform sample for aggregates that sketches do not cover
+        self.sample = df.sample(n=min(sample_size, self.row_count), random_state=0)
+
+        # Measured once; the summaries do not change after the build
+        self.nbytes = int(self.sample.memory_usage(deep=True).sum()) + sum(
+            s.registers.nbytes for s in self.distinct.values()
+        ) + sum(
+            level.nbytes for s in self.quantiles.values() for level in s.levels
+        ) + sum(
+            int(s.counters.memory_usage(deep=True)) for s in self.frequent.values() if s.counters is not None
+        )
+
+    def distinct_counts(self, columns: List[str]) -> List[Dict[str, Any]]:
+        rows = []
+        for col in columns:
+            sketch = self.distinct[col]
+            estimate = sketch.estimate()
+            margin = self.confidence_z * sketch.relative_error * estimate
+            rows.append({
+                "column": col,
+                "distinct_count": int(round(estimate)),
+                "error": int(math.ceil(margin))
+            })
+        return rows
+
+    def quantile_values(self, columns: List[str], q: float) -> List[Dict[str, Any]]:
+        rows = []
+        for col in columns:
+            sketch = self.quantiles[col]
+            eps = sketch.rank_error
+            rows.append({
+                "column": col,
+                "quantile": q,
+                "value": sketch.quantile(q),
+                "lower_bound": sketch.quantile(max(0.0, q - eps)),
+                "upper_bound": sketch.quantile(min(1.0, q + eps)),
+                "rank_error": round(eps, 4)
+            })
+        return rows
+
+    def top_values(self, column: str, n: int) -> List[Dict[str, Any]]:
+        return [{"column": column, **item} for item in self.frequent[column].top(n)]
+
+    def means(self, columns: List[str]) -> List[Dict[str, Any]]:
+        """Sample means with a normal-approximation confidence interval"""
+        n, N = len(self.sample), self.row_count
+        fpc = math.sqrt((N - n) / (N - 1)) if N > 1 else 0.0
+        rows = []
+        for col in columns:
+            values = self.sample[col].dropna()
+            if values.empty:
+                continue
+            std = float(values.std(ddof=1)) if len(values) > 1 else 0.0
+            margin = self.confidence_z * std / math.sqrt(len(values)) * fpc
+            rows.append({
+                "column": col,
+                "average": round(float(values.mean()), 2),
+                "error": round(margin, 4)
+            })
+        return rows
+
+    def error_bounds(self) -> Dict[str, Any]:
+        """
+        Describe the error guarantees of each summary, each with its own
+        confidence level: distinct counts and sample means use
+        ``confidence_z``, the KLL rank bound holds with about 99% probability
+        and the Misra-Gries undercount bound always holds.
+        """
+        confidence = round(math.erf(self.confidence_z / math.sqrt(2)), 4)
+        return {
+            "distinct_relative_error": {
+                "error": round(self.confidence_z * HyperLogLog().relative_error, 4),
+                "confidence": confidence
+            },
+            "mean_error": {"confidence": confidence},
+            "quantile_rank_error": {
+                "error": round(QuantileSketch().rank_error, 4),
+                "confidence": QuantileSketch.RANK_ERROR_CONFIDENCE
+            },
+            "top_values_max_undercount": {
+                "error": max((s.offset for s in self.frequent.values()), default=0),
+                "confidence": 1.0
+            },
+            "sample_size": len(self.sample)
+        }
+
+class SketchStore:
+    """Builds and holds sketches for datasets large enough to benefit from them"""
+
+    def __init__(self):
+        self.min_rows = int(os.getenv("SKETCH_MIN_ROWS", "1000000"))
+        self.sample_size = int(os.getenv("SKETCH_SAMPLE_SIZE", "100000"))
+        self._sketches: Dict[str, DatasetSketches] = {}
+        self._lock = threading.Lock()
+
+    def build(self, file_id: str, df: pd.DataFrame) -> Optional[DatasetSketches]:
+        """Summarize a freshly ingested dataset if it is over the row threshold"""
+        if len(df) < self.min_rows:
+            return None
+        sketches = DatasetSketches(df, self.sample_size)
+        with self._lock:
+            self._sketches[file_id] = sketches
+        return sketches
+
+    def get(self, file_id: str) -> Optional[DatasetSketches]:
+        with self._lock:
+            return self._sketches.get(file_id)
+
+    def drop(self, file_id: str) -> None:
+        with self._lock:
+            self._sketches.pop(file_id, None)
+
+    def nbytes(self) -> int:
+        """Memory held by every dataset's sketches and sample"""
+        with self._lock:
+            return sum(sketches.nbytes for sketches in self._sketches.values())
+
+# Global instance
+sketch_store = SketchStore()
@@ -0,0 +1,117 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+# Finest first; week buckets start on Monday
+GRAINS = ("day", "week", "month")
+
+def _bucket(days: np.ndarray, grain: str) -> np.ndarray:
+    """Map datetime64[D] values to the first day of their bucket"""
+    if grain == "week":
+        # 1970-01-01 was a Thursday, three days after a Monday
+        offsets = (days.astype(np.int64) + 3) % 7
+        return days - offsets.astype("timedelta64[D]")
+    if grain == "month":
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+    return days
+
+class TimeRollup:
+    """Per-bucket sums and non-null counts of numeric columns at one grain"""
+
+    def __init__(self, grain: str, sums: pd.DataFrame, counts: pd.DataFrame):
+        self.grain = grain
+        self.sums = sums
+        self.counts = counts
+
+    def __len__(self) -> int:
+        return len(self.sums)
+
+    def coarsen(self, grain: str) -> "TimeRollup":
+        """Roll this rollup up to a coarser grain; sums and counts add up exactly"""
+        keys = _bucket(self.sums.index.to_numpy(dtype="datetime64[D]"), grain)
+        return TimeRollup(
+            grain,
+            self.sums.groupby(keys).sum(min_count=1),
+            self.counts.groupby(keys).sum()
+        )
+
+    def values(self, columns: List[str], how: str = "sum") -> pd.DataFrame:
+        if how == "mean":
+            return self.sums[columns] / self.counts[columns].replace(0, np.nan)
+        return self.sums[columns]
+
+class DatasetRollups:
+    """Day, week and month rollups of a dataset's numeric columns per date column"""
+
+    def __init__(self, df: pd.DataFrame, date_columns: List[str], numeric_columns: Optional[List[str]] = None):
+        if numeric_columns is None:
+            numeric_columns = [
+                col for col in df.columns
+                if pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])
+            ]
+        self.numeric_columns = numeric_columns
+        self.rollups: Dict[str, Dict[str, TimeRollup]] = {}
+        for date_column in date_columns:
+            # One grouped pass over the raw rows at day grain; coarser grains
+            # are rolled up from the day buckets
+            days = df[date_column].to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+            grouped = df[numeric_columns].groupby(days, sort=True)
+            day = TimeRollup("day", grouped.sum(min_count=1), grouped.count())
+            self.rollups[date_column] = {"day": day, "week": day.coarsen("week"), "month": day.coarsen("month")}
+        self.nbytes = sum(
+            int(frame.memory_usage(deep=True).sum())
+            for grains in self.rollups.values() for rollup in grains.values()
+            for frame in (rollup.sums, rollup.counts)
+        )
+
+    def series(self, date_column: str, columns: List[str], how: str = "sum",
+               grain: Optional[str] = None, max_points: int = 1000) -> Tuple[str, pd.DataFrame]:
+        """
+        Bucketed values of ``columns`` over ``date_column``.
+
+        Without an explicit grain, the finest grain with at most
+        ``max_points`` buckets is used (month if none fits).
+        """
+        rollups = self.rollups[date_column]
+        if grain is None:
+            grain = next((g for g in GRAINS if len(rollups[g]) <= max_points), GRAINS[-1])
+        frame = rollups[grain].values(columns, how)
+        frame.index = pd.DatetimeIndex(frame.index, name=date_column)
+        return grain, frame.reset_index()
+
+class RollupStore:
+    """Holds time rollups per dataset, built once at upload"""
+
+    def __init__(self):
+        self.enabled = os.getenv("ENABLE_ROLLUPS", "true").lower() == "true"
+        self.max_date_columns = int(os.getenv("ROLLUP_MAX_DATE_COLUMNS", "3"))
+        self._rollups: Dict[str, DatasetRollups] = {}
+        self._lock = threading.Lock()
+
+    def build(self, file_id: str, df: pd.DataFrame) -> Optional[DatasetRollups]:
+        """Build rollups for the dataset's first date columns, if it has any"""
+        date_columns = [col for col in df.columns if pd.api.types.is_datetime64_any_dtype(df[col])]
+        if not self.enabled or not date_columns:
+            return None
+        rollups = DatasetRollups(df, date_columns[:self.max_date_columns])
+        with self._lock:
+            self._rollups[file_id] = rollups
+        return rollups
+
+    def get(self, file_id: str) -> Optional[DatasetRollups]:
+        with self._lock:
+            return self._rollups.get(file_id)
+
+    def drop(self, file_id: str) -> None:
+        with self._lock:
+            self._rollups.pop(file_id, None)
+
+    def nbytes(self) -> int:
+        """Memory held by every dataset's rollups"""
+        with self._lock:
+            return sum(rollups.nbytes for rollups in self._rollups.values())
+
+# Global instance
+rollup_store = RollupStore()
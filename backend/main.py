@@ -2,7 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import uvicorn
-from app.api import upload, analyze, suggestions
+from app.api import upload, analyze, suggestions, jobs
 
 app = FastAPI(
     title="Dataverse.ai API",
@@ -23,6 +23,7 @@ app.add_middleware(
 app.include_router(upload.router, prefix="/api/v1", tags=["upload"])
 app.include_router(analyze.router, prefix="/api/v1", tags=["analyze"])
 app.include_router(suggestions.router, prefix="/api/v1", tags=["suggestions"])
+app.include_router(jobs.router, prefix="/api/v1", tags=["jobs"])
 
 @app.get("/")
 async def root():
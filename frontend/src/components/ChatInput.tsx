@@ -183,7 +183,7 @@ export function ChatInput({
           <input
             ref={fileInputRef}
             type="file"
-            accept=".csv,.xlsx,.xls"
+            accept=".csv,.xlsx,.xls,.gz,.zst,.zip"
             onChange={handleFileChange}
             className="hidden"
           />
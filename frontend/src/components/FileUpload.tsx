@@ -80,6 +80,9 @@ export function FileUpload({
       "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": [
         ".xlsx",
       ],
+      "application/gzip": [".gz"],
+      "application/zstd": [".zst"],
+      "application/zip": [".zip"],
     },
     multiple: false,
   });